@@ -1,5 +1,8 @@
 from collections import deque
+import heapq
 import re
+import numpy as np
+from amcc.search_states import PackedStates, RowStates
 
 
 class BFSAMCCModifier:
@@ -12,13 +15,34 @@ class BFSAMCCModifier:
         dataset_loader : object
             An object responsible for loading and managing the dataset.
         predictor : object
-            An object that provides classification predictions. It should have a 'classifier.predict' method.
+            An object that provides classification predictions, with 'predict' and 'predict_proba' methods
+            and a 'classes' attribute, such as `ml_model.ml_model.ML_Model`.
         explainer : object
             An instance from the "Anchors: High-Precision Model-Agnostic Explanations" specifically designed for providing explanations on tabular data.
         transition_rules : dict, optional
-            A dictionary where keys are feature indices and values are functions that accept two parameters:
-            the current feature value and the new value. The function should return a boolean indicating
-            whether the transition between these values is allowed.
+            A dictionary where keys are feature indices and values are `n_values x n_values` boolean matrices
+            (see `bfs_amcc_runner.compile_transition_rule`). Entry `[old, new]` tells whether changing the
+            feature from value `old` to value `new` is allowed.
+        search_strategy : str, optional
+            'bfs' pops and scores one candidate at a time. 'level_bfs' scores a whole BFS depth at once,
+            in chunks of at most `max_batch_size` rows per `predict` call. Both return the same instance.
+            'best_first' expands candidates from a heap ordered by (number of edits, `predict_proba` of the
+            original class); it returns a counterfactual with the same, minimal, number of edits.
+            'bidirectional' bounds the number of edits from blends of `instance` with training rows of
+            another class, then proves the bound with a level BFS over fewer edits; it also returns a
+            minimal number of edits and records a certificate in `stats`.
+        max_batch_size : int, optional
+            Maximum number of candidates stacked into a single `predict` call by 'level_bfs' and
+            'bidirectional'.
+        packed_states : bool, optional
+            Keep search states as int64 codes of the edited features (see `amcc.search_states`) rather
+            than full rows, when they fit into 63 bits. Results are the same either way.
+        stats : dict
+            Counters from the most recent `bfs_amcc` call: 'visited_hits' (candidates skipped because the
+            same instance was already queued), 'visited_misses' (candidates queued for scoring),
+            'nodes_scored' (candidates passed to the classifier), 'nodes_expanded' (candidates whose
+            children were generated), 'status' ('found', 'exhausted' or 'timed_out') and 'certificate'
+            (set by 'bidirectional', see `_bidirectional_amcc`).
 
         Methods:
         -------
@@ -26,16 +50,29 @@ class BFSAMCCModifier:
             Extracts and returns feature names from a given anchor string.
 
         bfs_amcc(instance: array_like, original_prediction: int, categorical_names: dict,
-                 specific_indices: list=None, ignore_indices: list=None) -> array_like
+                 specific_indices: list=None, ignore_indices: list=None, deadline: Deadline=None) -> array_like
             Applies BFS to find a counterfactual instance that leads to a different classification than the original.
             Returns the modified instance.
     """
 
-    def __init__(self, dataset_loader, predictor, explainer, transition_rules=None):
+    SEARCH_STRATEGIES = ("bfs", "level_bfs", "best_first", "bidirectional")
+
+    def __init__(self, dataset_loader, predictor, explainer, transition_rules=None, search_strategy="bfs",
+                 max_batch_size=1024, packed_states=True):
+        if search_strategy not in self.SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy '{search_strategy}'. "
+                             f"Expected one of {self.SEARCH_STRATEGIES}.")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be greater than 0.")
         self.dataset_loader = dataset_loader
         self.predictor = predictor
         self.explainer = explainer
         self.transition_rules = transition_rules
+        self.search_strategy = search_strategy
+        self.max_batch_size = max_batch_size
+        self.packed_states = packed_states
+        self._train_predictions = None
+        self.stats = self._empty_stats()
 
     @staticmethod
     def extract_features(anchor):
@@ -43,7 +80,7 @@ class BFSAMCCModifier:
         return features
 
     def bfs_amcc(self, instance, original_prediction, categorical_names, specific_indices=None,
-                 ignore_indices=None):
+                 ignore_indices=None, deadline=None):
 
         """
         Uses BFS to find a modified instance (based on specific criteria) that results in a different
@@ -63,6 +100,9 @@ class BFSAMCCModifier:
             except those in `ignore_indices` are considered.
         ignore_indices : list, optional
             A list of feature indices that should not be modified.
+        deadline : utils.timing.Deadline, optional
+            Time budget checked before each scoring step (a node, or a chunk of a BFS level). When it expires
+            the search stops, returns None and sets `stats['status']` to 'timed_out'.
 
         Returns:
         -------
@@ -72,31 +112,340 @@ class BFSAMCCModifier:
 
         if ignore_indices is None:
             ignore_indices = []
-        queue = deque([([], instance)])
+        if specific_indices is None:
+            indices_to_modify = [i for i in categorical_names.keys() if i not in ignore_indices]
+        else:
+            indices_to_modify = [i for i in specific_indices if i not in ignore_indices]
+        self.stats = self._empty_stats()
+
+        if self.search_strategy == "level_bfs":
+            search = self._level_bfs_amcc
+        elif self.search_strategy == "best_first":
+            search = self._best_first_amcc
+        elif self.search_strategy == "bidirectional":
+            search = self._bidirectional_amcc
+        else:
+            search = self._queue_bfs_amcc
+        modified_instance = search(instance, original_prediction, categorical_names, indices_to_modify, deadline)
+        if self.stats["status"] is None:
+            self.stats["status"] = "exhausted" if modified_instance is None else "found"
+        return modified_instance
+
+    def _queue_bfs_amcc(self, instance, original_prediction, categorical_names, indices_to_modify, deadline):
+        """
+        Per-node BFS: pops and scores one candidate at a time.
+        """
+        states = self._search_states(instance, categorical_names, indices_to_modify)
+        queue = deque(states.initial())
+        visited = {states.key(queue[0])}
         best_modified_instance = None
 
         while queue:
-            changed_indices, current_instance = queue.popleft()
-            current_prediction = self.predictor.classifier.predict(current_instance.reshape(1, -1))[0]
+            if self._timed_out(deadline):
+                break
+            current = np.array([queue.popleft()])
+            current_instance = states.rows(current)[0]
+            current_prediction = self.predictor.predict(current_instance.reshape(1, -1))[0]
+            self.stats["nodes_scored"] += 1
 
             if current_prediction != original_prediction:
                 best_modified_instance = current_instance
                 break
 
-            if specific_indices is None:
-                indices_to_modify = [i for i in categorical_names.keys() if i not in ignore_indices]
-            else:
-                indices_to_modify = [i for i in specific_indices if i not in ignore_indices]
-
-            for index in indices_to_modify:
-                if index not in changed_indices and index in categorical_names:
-                    for value in range(len(categorical_names[index])):
-                        if value != current_instance[index]:
-                            if self.transition_rules and index in self.transition_rules:
-                                if not self.transition_rules[index](current_instance[index], value):
-                                    continue
-                            modified_instance = current_instance.copy()
-                            modified_instance[index] = value
-                            queue.append((changed_indices + [index], modified_instance))
+            self.stats["nodes_expanded"] += 1
+            queue.extend(self._unseen(states, states.children(current), visited))
 
         return best_modified_instance
+
+    def _level_bfs_amcc(self, instance, original_prediction, categorical_names, indices_to_modify, deadline):
+        """
+        Level-synchronous variant of `bfs_amcc`. Every node of a BFS depth is scored before the next
+        depth is generated, stacking up to `max_batch_size` rows per `predict` call. Nodes are scored
+        in queue order, so the first flipped node is the one the per-node BFS would return.
+
+        Every feature is edited at most once, so a node's depth equals the number of features in which it
+        differs from `instance`; identical instances can therefore only meet within one level, and
+        duplicates are removed per level.
+        """
+        states = self._search_states(instance, categorical_names, indices_to_modify)
+        level = states.initial()
+
+        while level.shape[0]:
+            modified_instance = self._first_flipped(states.rows, level, original_prediction, deadline)
+            if modified_instance is not None or self.stats["status"] == "timed_out":
+                return modified_instance
+            level = self._next_level(states, level)
+
+        return None
+
+    def _bidirectional_amcc(self, instance, original_prediction, categorical_names, indices_to_modify, deadline):
+        """
+        Bidirectional variant of `bfs_amcc` for counterfactuals that need several edits.
+
+        The forward level BFS runs as in 'level_bfs' while levels fit into one `max_batch_size` batch. Once
+        a level outgrows it, a backward search starts from the training rows the model predicts differently.
+        Each row is blended into `instance` on the features where changing to the row's value is an allowed
+        edit, and blends that flip the prediction are walked back towards `instance`, reverting one edit at
+        a time while the prediction stays flipped. The closest flipped blend, `d` edits away, bounds the
+        answer, so the forward search only has to score the candidates with fewer than `d` edits. If none
+        of them flips, the blend is minimal; otherwise the forward search returns the first flipped
+        candidate, as 'level_bfs' would.
+
+        When the search is not cut short by the deadline, `stats['certificate']` records the proof:
+        'edits' (edits of the returned instance, None if there is none), 'source' ('forward', 'backward'
+        or 'exhausted') and 'levels_exhausted' (every candidate with fewer edits was scored and none
+        flipped).
+        """
+        states = self._search_states(instance, categorical_names, indices_to_modify)
+        bound = bound_instance = None
+        searched_backward = False
+        level = states.initial()
+        depth = 0
+
+        while level.shape[0]:
+            if not searched_backward and level.shape[0] > self.max_batch_size:
+                searched_backward = True
+                edit_index, edit_value = self._candidate_edits(instance, categorical_names, indices_to_modify)
+                bound, bound_instance = self._backward_bound(instance, original_prediction, edit_index,
+                                                             edit_value, depth, deadline)
+                if self.stats["status"] == "timed_out":
+                    return None
+            if bound is not None and depth >= bound:
+                self.stats["certificate"] = {"edits": bound, "source": "backward", "levels_exhausted": bound}
+                return bound_instance
+
+            modified_instance = self._first_flipped(states.rows, level, original_prediction, deadline)
+            if self.stats["status"] == "timed_out":
+                return None
+            if modified_instance is not None:
+                self.stats["certificate"] = {"edits": depth, "source": "forward", "levels_exhausted": depth}
+                return modified_instance
+            depth += 1
+            if bound is None or depth < bound:
+                level = self._next_level(states, level)
+
+        self.stats["certificate"] = {"edits": None, "source": "exhausted", "levels_exhausted": depth}
+        return None
+
+    def _backward_bound(self, instance, original_prediction, edit_index, edit_value, min_edits, deadline):
+        """
+        Returns `(d, modified_instance)` for the closest flipped blend of `instance` with a training row
+        predicted differently (see `_bidirectional_amcc`), or `(None, None)` if no blend flips. Candidates
+        with fewer than `min_edits` edits are known not to flip and are skipped.
+        """
+        features = np.unique(edit_index)
+        if features.size == 0:
+            return None, None
+        # allowed[i, v]: changing features[i] to v is an allowed edit
+        allowed = np.zeros((features.size, int(edit_value.max()) + 1), dtype=bool)
+        allowed[np.searchsorted(features, edit_index), edit_value.astype(int)] = True
+        targets = self._contrast_rows(original_prediction)[:, features]
+        codes = targets.astype(int)
+        editable = (codes == targets) & (codes >= 0) & (codes < allowed.shape[1])
+        editable &= allowed[np.arange(features.size), np.where(editable, codes, 0)]
+
+        blends = np.repeat(instance.reshape(1, -1), targets.shape[0], axis=0)
+        blends[:, features] = np.where(editable, targets, instance[features])
+        blends = blends[self._first_distinct(blends, features)]
+        distances = (blends != instance).sum(axis=1)
+        order = np.argsort(distances, kind="stable")
+        blends = blends[order[distances[order] >= min_edits]]
+
+        # blends are sorted by distance, so the first chunk with a flipped blend holds the closest one
+        frontier = blends[:0]
+        for start in range(0, blends.shape[0], self.max_batch_size):
+            frontier = self._flipped(blends[start:start + self.max_batch_size], original_prediction, deadline)
+            if frontier.shape[0] or self.stats["status"] == "timed_out":
+                break
+        if frontier.shape[0] == 0:
+            return None, None
+        bound = int((frontier[0] != instance).sum())
+        frontier = frontier[(frontier != instance).sum(axis=1) == bound][:self.max_batch_size]
+
+        while bound > min_edits:
+            # every single-edit revert of the frontier, bound - 1 edits away
+            changed_rows, changed_features = np.nonzero(frontier != instance)
+            parents = frontier[changed_rows]
+            parents[np.arange(parents.shape[0]), changed_features] = instance[changed_features]
+            parents = self._flipped(parents[self._first_distinct(parents, features)], original_prediction,
+                                    deadline)
+            if parents.shape[0] == 0:
+                break
+            bound -= 1
+            frontier = parents[:self.max_batch_size]
+        return bound, frontier[0]
+
+    @staticmethod
+    def _first_distinct(rows, features):
+        """
+        Returns the sorted indices of the first occurrence of every distinct row in `rows`, whose columns
+        other than `features` are all equal and whose `features` hold categorical codes.
+        """
+        codes = rows[:, features].astype(np.int64)
+        dims = codes.max(axis=0, initial=0) + 1
+        if np.prod(dims.astype(float)) < 2 ** 63:
+            _, first = np.unique(np.ravel_multi_index(codes.T, dims), return_index=True)
+        else:
+            _, first = np.unique(codes, axis=0, return_index=True)
+        return np.sort(first)
+
+    def _contrast_rows(self, original_prediction):
+        """
+        Returns the training rows the model predicts differently from `original_prediction`. The training
+        predictions are computed once per modifier.
+        """
+        if self._train_predictions is None:
+            self._train_predictions = self.predictor.predict(self.dataset_loader.dataset.train)
+        return self.dataset_loader.dataset.train[self._train_predictions != original_prediction]
+
+    def _flipped(self, rows, original_prediction, deadline):
+        """
+        Scores `rows` in chunks of at most `max_batch_size` and returns those predicted differently from
+        `original_prediction`, in order. Stops early, with the rows found so far, when `deadline` expires.
+        """
+        flipped = []
+        for start in range(0, rows.shape[0], self.max_batch_size):
+            if self._timed_out(deadline):
+                break
+            chunk = rows[start:start + self.max_batch_size]
+            flipped.append(chunk[self.predictor.predict(chunk) != original_prediction])
+            self.stats["nodes_scored"] += chunk.shape[0]
+        return np.concatenate(flipped) if flipped else rows[:0]
+
+    def _first_flipped(self, decode, level, original_prediction, deadline):
+        """
+        Scores the BFS `level` in queue order, stacking up to `max_batch_size` rows per `predict` call, and
+        returns the first instance predicted differently from `original_prediction`, or None.
+        """
+        for start in range(0, level.shape[0], self.max_batch_size):
+            if self._timed_out(deadline):
+                return None
+            chunk = decode(level[start:start + self.max_batch_size])
+            predictions = self.predictor.predict(chunk)
+            flipped = np.flatnonzero(predictions != original_prediction)
+            if flipped.size:
+                self.stats["nodes_scored"] += int(flipped[0]) + 1
+                return chunk[flipped[0]]
+            self.stats["nodes_scored"] += chunk.shape[0]
+        return None
+
+    def _next_level(self, states, level):
+        """
+        Expands every node of `level` and returns the deduplicated children, in queue order.
+        """
+        self.stats["nodes_expanded"] += level.shape[0]
+        level = states.children(level)
+        first = states.first_occurrences(level)
+        self.stats["visited_hits"] += level.shape[0] - first.size
+        self.stats["visited_misses"] += first.size
+        return level[first]
+
+    def _best_first_amcc(self, instance, original_prediction, categorical_names, indices_to_modify, deadline):
+        """
+        Best-first variant of `bfs_amcc`. Candidates are scored with `predict_proba` when generated and
+        pushed on a heap keyed by (number of edits, probability of the original class), so among
+        candidates with the same number of edits the ones closest to flipping are expanded first.
+
+        The edit count is the primary key, so every k-edit candidate has been generated and scored
+        before any k-edit candidate is expanded. The first flipped child therefore has a minimal number
+        of edits, and the search stops without generating the rest of the (k + 1)-edit level.
+        """
+        predictor = self.predictor
+        original_column = list(predictor.classes).index(original_prediction)
+        states = self._search_states(instance, categorical_names, indices_to_modify)
+
+        probabilities = predictor.predict_proba(instance.reshape(1, -1))[0]
+        self.stats["nodes_scored"] += 1
+        if np.argmax(probabilities) != original_column:
+            return instance
+
+        initial = states.initial()[0]
+        heap = [(0, probabilities[original_column], 0, initial)]
+        visited = {states.key(initial)}
+        pushed = 1
+
+        while heap:
+            if self._timed_out(deadline):
+                return None
+            n_edits, _, _, current = heapq.heappop(heap)
+            self.stats["nodes_expanded"] += 1
+            children = states.children(np.array([current]))
+            unseen = []
+            for i, child in enumerate(children):
+                key = states.key(child)
+                if key in visited:
+                    self.stats["visited_hits"] += 1
+                    continue
+                visited.add(key)
+                unseen.append(i)
+            self.stats["visited_misses"] += len(unseen)
+            if not unseen:
+                continue
+
+            children = children[unseen]
+            rows = states.rows(children)
+            probabilities = predictor.predict_proba(rows)
+            self.stats["nodes_scored"] += children.shape[0]
+            flipped = np.flatnonzero(np.argmax(probabilities, axis=1) != original_column)
+            if flipped.size:
+                return rows[flipped[np.argmin(probabilities[flipped, original_column])]]
+
+            for child, probability in zip(children, probabilities[:, original_column]):
+                heapq.heappush(heap, (n_edits + 1, probability, pushed, child))
+                pushed += 1
+
+        return None
+
+    def _candidate_edits(self, instance, categorical_names, indices_to_modify):
+        """
+        Lists every single-feature edit `(index, value)` allowed from `instance`, in the order the per-node
+        BFS tries them. Since a feature is edited at most once, its old value is always the original one,
+        so the transition matrices only need to be looked up once per search.
+        """
+        masks = self.transition_rules or {}
+        edit_index, edit_value = [], []
+        for index in indices_to_modify:
+            if index in categorical_names:
+                old = int(instance[index])
+                for value in range(len(categorical_names[index])):
+                    if value != instance[index] and (index not in masks or masks[index][old, value]):
+                        edit_index.append(index)
+                        edit_value.append(value)
+        return np.array(edit_index, dtype=int), np.array(edit_value, dtype=instance.dtype)
+
+    def _search_states(self, instance, categorical_names, indices_to_modify):
+        """
+        Returns the state representation of a search from `instance`: int64 codes (`PackedStates`) when
+        `packed_states` is set and the edited features fit, full rows (`RowStates`) otherwise.
+        """
+        edit_index, edit_value = self._candidate_edits(instance, categorical_names, indices_to_modify)
+        if self.packed_states:
+            states = PackedStates.create(instance, edit_index, edit_value, categorical_names)
+            if states is not None:
+                return states
+        return RowStates(instance, edit_index, edit_value)
+
+    def _unseen(self, states, children, visited):
+        """
+        Filters out children already in `visited`, so the same set of edits reached in a different order is
+        queued only once.
+        """
+        for child in children:
+            key = states.key(child)
+            if key in visited:
+                self.stats["visited_hits"] += 1
+                continue
+            visited.add(key)
+            self.stats["visited_misses"] += 1
+            yield child
+
+    @staticmethod
+    def _empty_stats():
+        return {"visited_hits": 0, "visited_misses": 0, "nodes_scored": 0, "nodes_expanded": 0, "status": None,
+                "certificate": None}
+
+    def _timed_out(self, deadline):
+        if deadline is not None and deadline.expired():
+            self.stats["status"] = "timed_out"
+            return True
+        return False
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+class RowStates:
+    """
+    Search states stored as full instance rows.
+
+    Both state classes share one interface, so the BFS-AMCC strategies work on blocks of states without
+    knowing their encoding: `initial` returns the block holding the original instance, `rows` decodes a
+    block to instance rows for scoring, `children` builds all single-edit children of a block, `key` gives a
+    hashable visited-set key for one state and `first_occurrences` deduplicates a block.
+
+    Attributes:
+    ----------
+    instance : np.ndarray
+        The original instance.
+    edit_index, edit_value : np.ndarray
+        The allowed single-feature edits, as listed by `BFSAMCCModifier._candidate_edits`.
+    """
+    def __init__(self, instance, edit_index, edit_value):
+        self.instance = instance
+        self.edit_index = edit_index
+        self.edit_value = edit_value
+
+    def initial(self):
+        return self.instance.reshape(1, -1).copy()
+
+    def rows(self, states):
+        return states
+
+    def children(self, states):
+        """
+        Builds all single-edit children of `states` at once. Each row is repeated once per edit that
+        touches a still-unchanged feature and the edited values are written with one fancy-index
+        assignment. Children are ordered by parent, then by edit.
+        """
+        allowed = states[:, self.edit_index] == self.instance[self.edit_index]
+        _, edits = np.nonzero(allowed)
+        children = np.repeat(states, allowed.sum(axis=1), axis=0)
+        children[np.arange(children.shape[0]), self.edit_index[edits]] = self.edit_value[edits]
+        return children
+
+    @staticmethod
+    def key(state):
+        return state.tobytes()
+
+    @staticmethod
+    def first_occurrences(states):
+        """Returns the sorted indices of the first occurrence of every distinct state in `states`."""
+        _, first = np.unique(states, axis=0, return_index=True)
+        return np.sort(first)
+
+
+class PackedStates:
+    """
+    Search states packed into one int64 code each.
+
+    Only the features with at least one allowed edit vary during a search, and each holds a categorical code,
+    so a state is stored as those codes packed into `ceil(log2(n_values))` bits per feature. Features that are
+    never edited are taken from the original instance when decoding. A state costs 8 bytes instead of a
+    float64 row, and children and duplicates are computed with integer arithmetic on the codes.
+
+    Use `create`, which returns None when the edited features do not fit into `MAX_BITS` bits or the
+    instance does not hold valid codes for them.
+    """
+    MAX_BITS = 63
+
+    def __init__(self, instance, edit_index, edit_value, features, widths):
+        self.instance = instance
+        self.features = features
+        self.shifts = np.cumsum(np.concatenate(([0], widths)))[:-1].astype(np.int64)
+        self.masks = (np.int64(1) << np.asarray(widths, dtype=np.int64)) - 1
+        self.original = instance[features].astype(np.int64)
+
+        position = np.searchsorted(features, edit_index)
+        self.edit_shift = self.shifts[position]
+        self.edit_mask = self.masks[position]
+        self.edit_original = self.original[position]
+        self.edit_delta = (edit_value.astype(np.int64) - self.edit_original) << self.edit_shift
+
+    @classmethod
+    def create(cls, instance, edit_index, edit_value, categorical_names):
+        features = np.unique(edit_index)
+        n_values = [len(categorical_names[index]) for index in features]
+        widths = [max(1, (n - 1).bit_length()) for n in n_values]
+        if sum(widths) > cls.MAX_BITS:
+            return None
+        values = instance[features]
+        if not (np.array_equal(values, np.round(values)) and np.all(values >= 0) and np.all(values < n_values)):
+            return None
+        return cls(instance, edit_index, edit_value, features, widths)
+
+    def initial(self):
+        return np.array([np.sum(self.original << self.shifts)], dtype=np.int64)
+
+    def rows(self, states):
+        rows = np.repeat(self.instance.reshape(1, -1), states.shape[0], axis=0)
+        rows[:, self.features] = (states[:, np.newaxis] >> self.shifts) & self.masks
+        return rows
+
+    def children(self, states):
+        """
+        Builds all single-edit children of `states` at once, in the same order as `RowStates.children`.
+        A feature is still unchanged when its field equals the original code, and an edit adds the
+        difference between the new and the original code, shifted into the feature's field.
+        """
+        allowed = ((states[:, np.newaxis] >> self.edit_shift) & self.edit_mask) == self.edit_original
+        _, edits = np.nonzero(allowed)
+        return np.repeat(states, allowed.sum(axis=1)) + self.edit_delta[edits]
+
+    @staticmethod
+    def key(state):
+        return int(state)
+
+    @staticmethod
+    def first_occurrences(states):
+        """Returns the sorted indices of the first occurrence of every distinct state in `states`."""
+        _, first = np.unique(states, return_index=True)
+        return np.sort(first)
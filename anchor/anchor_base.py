@@ -2,11 +2,50 @@
 from __future__ import print_function
 import numpy as np
 import operator
-import copy
 import sklearn
 import collections
 
 
+# Number of set bits of every byte value, for popcounts over np.packbits arrays
+POPCOUNT_TABLE = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    return int(POPCOUNT_TABLE[bits].sum())
+
+
+def bitset_and(a, b):
+    # bitsets may have different lengths; missing bytes are all zero
+    n = min(a.shape[0], b.shape[0])
+    return a[:n] & b[:n]
+
+
+def bitset_set_range(bits, start, stop):
+    """Sets bits start..stop-1, growing bits by doubling when needed.
+    May return a new array."""
+    if stop <= start:
+        return bits
+    n_bytes = (stop + 7) // 8
+    if bits.shape[0] < n_bytes:
+        grown = np.zeros(max(n_bytes, 2 * bits.shape[0]), np.uint8)
+        grown[:bits.shape[0]] = bits
+        bits = grown
+    first, last = start // 8, (stop - 1) // 8
+    head = 0xFF >> (start % 8)
+    tail = (0xFF << (7 - (stop - 1) % 8)) & 0xFF
+    if first == last:
+        bits[first] |= head & tail
+    else:
+        bits[first] |= head
+        bits[first + 1:last] = 0xFF
+        bits[last] |= tail
+    return bits
+
+
+def bitset_indices(bits):
+    return np.flatnonzero(np.unpackbits(bits))
+
+
 def matrix_subset(matrix, n_samples):
     if matrix.shape[0] == 0:
         return matrix
@@ -14,40 +53,95 @@ def matrix_subset(matrix, n_samples):
     return matrix[np.random.choice(matrix.shape[0], n_samples, replace=False)]
 
 
+class SampleArena(object):
+    """Growable sample buffers for anchor_beam, meant to be reused across
+    explanations: data holds the 0/1 predicate columns, raw_data the
+    perturbed rows and labels the classifier agreement, each filled up to
+    size. Capacity doubles when full and is kept by reset(). raw_data must
+    be numeric."""
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.size = 0
+        self.data = np.empty((capacity, 0), np.int8)
+        self.raw_data = np.empty((capacity, 0), np.float64)
+        self.labels = np.empty(capacity, np.int8)
+
+    def reset(self, n_predicates, n_raw_features, raw_dtype=np.float64):
+        """Empties the arena for samples of the given widths"""
+        if np.dtype(raw_dtype).kind not in 'biuf':
+            raise ValueError('SampleArena needs numeric raw data, got %s'
+                             % np.dtype(raw_dtype))
+        self.size = 0
+        if self.data.shape[1] != n_predicates:
+            self.data = np.empty((self.capacity, n_predicates), np.int8)
+        if (self.raw_data.shape[1] != n_raw_features or
+                self.raw_data.dtype != raw_dtype):
+            self.raw_data = np.empty((self.capacity, n_raw_features),
+                                     raw_dtype)
+
+    def append(self, raw_data, data, labels):
+        """Appends a batch of samples, returns the index of its first row"""
+        n = data.shape[0]
+        start = self.size
+        if start + n > self.capacity:
+            self.grow(max(start + n, 2 * self.capacity))
+        self.data[start:start + n] = data
+        self.raw_data[start:start + n] = raw_data
+        self.labels[start:start + n] = labels
+        self.size += n
+        return start
+
+    def grow(self, capacity):
+        def grown(array):
+            new = np.empty((capacity, ) + array.shape[1:], array.dtype)
+            new[:self.size] = array[:self.size]
+            return new
+        self.data = grown(self.data)
+        self.raw_data = grown(self.raw_data)
+        self.labels = grown(self.labels)
+        self.capacity = capacity
+
+
 class AnchorBaseBeam(object):
     def __init__(self):
         pass
 
+    # kl_bernoulli, dup_bernoulli and dlow_bernoulli accept scalars or
+    # arrays of means and levels.
     @staticmethod
     def kl_bernoulli(p, q):
-        p = min(0.9999999999999999, max(0.0000001, p))
-        q = min(0.9999999999999999, max(0.0000001, q))
-        return (p * np.log(float(p) / q) + (1 - p) *
-                np.log(float(1 - p) / (1 - q)))
+        p = np.clip(np.asarray(p, dtype=float), 0.0000001, 0.9999999999999999)
+        q = np.clip(np.asarray(q, dtype=float), 0.0000001, 0.9999999999999999)
+        return (p * np.log(p / q) + (1 - p) *
+                np.log((1 - p) / (1 - q)))[()]
 
     @staticmethod
-    def dup_bernoulli(p, level):
+    def dup_bernoulli(p, level, n_iter=1):
+        # n_iter bisection steps on [p, p + sqrt(level / 2)]
+        p = np.asarray(p, dtype=float)
+        level = np.asarray(level, dtype=float)
         lm = p
-        um = min(min(1, p + np.sqrt(level / 2.)), 1)
-        qm = (um + lm) / 2.
-#         print 'lm', lm, 'qm', qm, kl_bernoulli(p, qm)
-        if AnchorBaseBeam.kl_bernoulli(p, qm) > level:
-            um = qm
-        else:
-            lm = qm
-        return um
+        um = np.minimum(1, p + np.sqrt(level / 2.))
+        for _ in range(n_iter):
+            qm = (um + lm) / 2.
+            above = AnchorBaseBeam.kl_bernoulli(p, qm) > level
+            um = np.where(above, qm, um)
+            lm = np.where(above, lm, qm)
+        return um[()]
 
     @staticmethod
-    def dlow_bernoulli(p, level):
+    def dlow_bernoulli(p, level, n_iter=1):
+        # n_iter bisection steps on [p - sqrt(level / 2), p]
+        p = np.asarray(p, dtype=float)
+        level = np.asarray(level, dtype=float)
         um = p
-        lm = max(min(1, p - np.sqrt(level / 2.)), 0)
-        qm = (um + lm) / 2.
-#         print 'lm', lm, 'qm', qm, kl_bernoulli(p, qm)
-        if AnchorBaseBeam.kl_bernoulli(p, qm) > level:
-            lm = qm
-        else:
-            um = qm
-        return lm
+        lm = np.maximum(np.minimum(1, p - np.sqrt(level / 2.)), 0)
+        for _ in range(n_iter):
+            qm = (um + lm) / 2.
+            above = AnchorBaseBeam.kl_bernoulli(p, qm) > level
+            lm = np.where(above, qm, lm)
+            um = np.where(above, um, qm)
+        return lm[()]
 
     @staticmethod
     def compute_beta(n_features, t, delta):
@@ -58,16 +152,27 @@ class AnchorBaseBeam(object):
 
     @staticmethod
     def lucb(sample_fns, initial_stats, epsilon, delta, batch_size, top_n,
-             verbose=False, verbose_every=1):
+             verbose=False, verbose_every=1, deadline=None,
+             arms_sample_fn=None, bisection_iterations=1):
         # initial_stats must have n_samples, positive
+        # deadline (utils.timing.Deadline) is checked once per round; on
+        # expiry the current best top_n arms are returned
+        # arms_sample_fn (see get_arms_sample_fn), if given, samples the
+        # upper and lower arm of each round together
         n_features = len(sample_fns)
         n_samples = np.array(initial_stats['n_samples'])
         positives = np.array(initial_stats['positives'])
         ub = np.zeros(n_samples.shape)
         lb = np.zeros(n_samples.shape)
-        for f in np.where(n_samples == 0)[0]:
-            n_samples[f] += 1
-            positives[f] += sample_fns[f](1)
+        unsampled = np.where(n_samples == 0)[0]
+        if arms_sample_fn is not None and len(unsampled):
+            n_samples[unsampled] += 1
+            positives[unsampled] += arms_sample_fn(
+                [(f, 1) for f in unsampled])
+        elif arms_sample_fn is None:
+            for f in unsampled:
+                n_samples[f] += 1
+                positives[f] += sample_fns[f](1)
         if n_features == top_n:
             return range(n_features)
         means = positives / n_samples
@@ -78,12 +183,10 @@ class AnchorBaseBeam(object):
             beta = AnchorBaseBeam.compute_beta(n_features, t, delta)
             J = sorted_means[-top_n:]
             not_J = sorted_means[:-top_n]
-            for f in not_J:
-                ub[f] = AnchorBaseBeam.dup_bernoulli(means[f], beta /
-                                                     n_samples[f])
-            for f in J:
-                lb[f] = AnchorBaseBeam.dlow_bernoulli(means[f],
-                                                      beta / n_samples[f])
+            ub[not_J] = AnchorBaseBeam.dup_bernoulli(
+                means[not_J], beta / n_samples[not_J], bisection_iterations)
+            lb[J] = AnchorBaseBeam.dlow_bernoulli(
+                means[J], beta / n_samples[J], bisection_iterations)
             ut = not_J[np.argmax(ub[not_J])]
             lt = J[np.argmin(lb[J])]
             return ut, lt
@@ -91,6 +194,8 @@ class AnchorBaseBeam(object):
         B = ub[ut] - lb[lt]
         verbose_count = 0
         while B > epsilon:
+            if deadline is not None and deadline.expired():
+                break
             verbose_count += 1
             if verbose and verbose_count % verbose_every == 0:
                 print('Best: %d (mean:%.10f, n: %d, lb:%.4f)' %
@@ -98,11 +203,17 @@ class AnchorBaseBeam(object):
                 print('Worst: %d (mean:%.4f, n: %d, ub:%.4f)' %
                       (ut, means[ut], n_samples[ut], ub[ut]), end=' ')
                 print('B = %.2f' % B)
+            if arms_sample_fn is not None:
+                ut_positives, lt_positives = arms_sample_fn(
+                    [(ut, batch_size), (lt, batch_size)])
+            else:
+                ut_positives = sample_fns[ut](batch_size)
+                lt_positives = sample_fns[lt](batch_size)
             n_samples[ut] += batch_size
-            positives[ut] += sample_fns[ut](batch_size)
+            positives[ut] += ut_positives
             means[ut] = positives[ut] / n_samples[ut]
             n_samples[lt] += batch_size
-            positives[lt] += sample_fns[lt](batch_size)
+            positives[lt] += lt_positives
             means[lt] = positives[lt] / n_samples[lt]
             t += 1
             ut, lt = update_bounds(t)
@@ -113,27 +224,31 @@ class AnchorBaseBeam(object):
     @staticmethod
     def make_tuples(previous_best, state):
         # alters state, computes support for new tuples
+        # t_idx and t_coverage_idx are np.packbits bitsets over the rows of
+        # the sample arena and of the coverage sample
         normalize_tuple = lambda x: tuple(sorted(set(x)))  # noqa
         all_features = range(state['n_features'])
-        coverage_data = state['coverage_data']
-        current_idx = state['current_idx']
-        data = state['data'][:current_idx]
-        labels = state['labels'][:current_idx]
+        coverage_bits = state['coverage_bits']
+        n_coverage = float(state['n_coverage'])
+        arena = state['arena']
+        data = arena.data[:arena.size]
+        labels = arena.labels[:arena.size]
+        data_bits = np.packbits(data.T.astype(bool), axis=1)
+        label_bits = np.packbits(labels.astype(bool))
         if len(previous_best) == 0:
             tuples = [(x, ) for x in all_features]
             for x in tuples:
-                pres = data[:, x[0]].nonzero()[0]
+                pres = data_bits[x[0]].copy()
                 # NEW
-                state['t_idx'][x] = set(pres)
-                state['t_nsamples'][x] = float(len(pres))
-                state['t_positives'][x] = float(labels[pres].sum())
+                state['t_idx'][x] = pres
+                state['t_nsamples'][x] = float(popcount(pres))
+                state['t_positives'][x] = float(
+                    popcount(bitset_and(pres, label_bits)))
                 state['t_order'][x].append(x[0])
                 # NEW
-                state['t_coverage_idx'][x] = set(
-                    coverage_data[:, x[0]].nonzero()[0])
+                state['t_coverage_idx'][x] = coverage_bits[x[0]]
                 state['t_coverage'][x] = (
-                    float(len(state['t_coverage_idx'][x])) /
-                    coverage_data.shape[0])
+                    popcount(state['t_coverage_idx'][x]) / n_coverage)
             return tuples
         new_tuples = set()
         for f in all_features:
@@ -143,22 +258,17 @@ class AnchorBaseBeam(object):
                     continue
                 if new_t not in new_tuples:
                     new_tuples.add(new_t)
-                    state['t_order'][new_t] = copy.deepcopy(state['t_order'][t])
+                    state['t_order'][new_t] = list(state['t_order'][t])
                     state['t_order'][new_t].append(f)
                     state['t_coverage_idx'][new_t] = (
-                        state['t_coverage_idx'][t].intersection(
-                            state['t_coverage_idx'][(f,)]))
+                        state['t_coverage_idx'][t] & coverage_bits[f])
                     state['t_coverage'][new_t] = (
-                        float(len(state['t_coverage_idx'][new_t])) /
-                        coverage_data.shape[0])
-                    t_idx = np.array(list(state['t_idx'][t]))
-                    t_data = state['data'][t_idx]
-                    present = np.where(t_data[:, f] == 1)[0]
-                    state['t_idx'][new_t] = set(t_idx[present])
-                    idx_list = list(state['t_idx'][new_t])
-                    state['t_nsamples'][new_t] = float(len(idx_list))
-                    state['t_positives'][new_t] = np.sum(
-                        state['labels'][idx_list])
+                        popcount(state['t_coverage_idx'][new_t]) / n_coverage)
+                    present = bitset_and(state['t_idx'][t], data_bits[f])
+                    state['t_idx'][new_t] = present
+                    state['t_nsamples'][new_t] = float(popcount(present))
+                    state['t_positives'][new_t] = float(
+                        popcount(bitset_and(present, label_bits)))
         return list(new_tuples)
 
     @staticmethod
@@ -167,46 +277,45 @@ class AnchorBaseBeam(object):
         sample_fns = []
         def complete_sample_fn(t, n):
             raw_data, data, labels = sample_fn(list(t), n)
-            current_idx = state['current_idx']
-            # idxs = range(state['data'].shape[0], state['data'].shape[0] + n)
-            idxs = range(current_idx, current_idx + n)
-
-            if '<U' in str(raw_data.dtype):
-                # String types: make sure both string types are of maximum length
-                # to avoid string truncation. E.g., '<U308', '<U290' -> '<U308'
-                max_dtype = max(str(state['raw_data'].dtype), str(raw_data.dtype))
-                state['raw_data'] = state['raw_data'].astype(max_dtype)
-                raw_data = raw_data.astype(max_dtype)
-
-            state['t_idx'][t].update(idxs)
-            state['t_nsamples'][t] += n
-            state['t_positives'][t] += labels.sum()
-            state['data'][idxs] = data
-            state['raw_data'][idxs] = raw_data
-            state['labels'][idxs] = labels
-            state['current_idx'] += n
-            if state['current_idx'] >= state['data'].shape[0] - max(1000, n):
-                prealloc_size = state['prealloc_size']
-                current_idx = data.shape[0]
-                state['data'] = np.vstack(
-                    (state['data'],
-                     np.zeros((prealloc_size, data.shape[1]), data.dtype)))
-                state['raw_data'] = np.vstack(
-                    (state['raw_data'],
-                     np.zeros((prealloc_size, raw_data.shape[1]),
-                              raw_data.dtype)))
-                state['labels'] = np.hstack(
-                    (state['labels'],
-                     np.zeros(prealloc_size, labels.dtype)))
-            # This can be really slow
-            # state['data'] = np.vstack((state['data'], data))
-            # state['raw_data'] = np.vstack((state['raw_data'], raw_data))
-            # state['labels'] = np.hstack((state['labels'], labels))
-            return labels.sum()
+            return AnchorBaseBeam.store_samples(t, raw_data, data, labels,
+                                                state)
         for t in tuples:
             sample_fns.append(lambda n, t=t: complete_sample_fn(t, n))
         return sample_fns
 
+    @staticmethod
+    def get_arms_sample_fn(sample_fn, tuples, state):
+        # samples several arms at once: takes a list of (arm, n) requests,
+        # arm being an index into tuples, and returns the number of
+        # positives of each request. Samplers exposing sample_fn.batch
+        # (see AnchorTabularExplainer.get_sample_fn) label all requests with
+        # one classifier call.
+        batch_sample_fn = getattr(sample_fn, 'batch', None)
+        def arms_sample_fn(requests):
+            arm_tuples = [tuples[arm] for arm, _ in requests]
+            if batch_sample_fn is not None:
+                samples = batch_sample_fn(
+                    [(list(t), n) for t, (_, n) in zip(arm_tuples, requests)])
+            else:
+                samples = [sample_fn(list(t), n)
+                           for t, (_, n) in zip(arm_tuples, requests)]
+            return [AnchorBaseBeam.store_samples(t, raw_data, data, labels,
+                                                 state)
+                    for t, (raw_data, data, labels) in zip(arm_tuples,
+                                                           samples)]
+        return arms_sample_fn
+
+    @staticmethod
+    def store_samples(t, raw_data, data, labels, state):
+        # appends samples drawn for tuple t to state, returns positives
+        n = data.shape[0]
+        start = state['arena'].append(raw_data, data, labels)
+        state['t_idx'][t] = bitset_set_range(state['t_idx'][t], start,
+                                             start + n)
+        state['t_nsamples'][t] += n
+        state['t_positives'][t] += labels.sum()
+        return labels.sum()
+
 
     @staticmethod
     def get_initial_statistics(tuples, state):
@@ -224,7 +333,8 @@ class AnchorBaseBeam(object):
         # TODO: This is wrong, some of the intermediate anchors may not exist.
         anchor = {'feature': [], 'mean': [], 'precision': [],
                   'coverage': [], 'examples': [], 'all_precision': 0}
-        anchor['num_preds'] = state['data'].shape[0]
+        arena = state['arena']
+        anchor['num_preds'] = arena.size
         normalize_tuple = lambda x: tuple(sorted(set(x)))  # noqa
         current_t = tuple()
         for f in state['t_order'][t]:
@@ -236,12 +346,10 @@ class AnchorBaseBeam(object):
             anchor['mean'].append(mean)
             anchor['precision'].append(mean)
             anchor['coverage'].append(state['t_coverage'][current_t])
-            raw_idx = list(state['t_idx'][current_t])
-            raw_data = state['raw_data'][raw_idx]
-            covered_true = (
-                state['raw_data'][raw_idx][state['labels'][raw_idx] == 1])
-            covered_false = (
-                state['raw_data'][raw_idx][state['labels'][raw_idx] == 0])
+            raw_idx = bitset_indices(state['t_idx'][current_t])
+            raw_data = arena.raw_data[raw_idx]
+            covered_true = raw_data[arena.labels[raw_idx] == 1]
+            covered_false = raw_data[arena.labels[raw_idx] == 0]
             exs = {}
             exs['covered'] = matrix_subset(raw_data, 10)
             exs['covered_true'] = matrix_subset(covered_true, 10)
@@ -256,46 +364,60 @@ class AnchorBaseBeam(object):
                     min_shared_samples=0, desired_confidence=1, beam_size=1,
                     verbose=False, epsilon_stop=0.05, min_samples_start=0,
                     max_anchor_size=None, verbose_every=1,
-                    stop_on_first=False, coverage_samples=10000):
+                    stop_on_first=False, coverage_samples=10000,
+                    coverage_bits=None, deadline=None, batch_arms=True,
+                    bisection_iterations=1, arena=None):
+        # coverage_bits: optional precomputed coverage sample of
+        # coverage_samples rows, as one np.packbits row per predicate
+        # (see AnchorTabularExplainer.coverage_bits). Drawn with sample_fn
+        # otherwise.
+        # deadline (utils.timing.Deadline) is checked once per LUCB round and
+        # sampling step. On expiry the best anchor found so far is returned
+        # with anchor['status'] == 'timed_out'.
+        # batch_arms samples the two arms of each LUCB round together, and
+        # bisection_iterations sets the number of bisection steps of the KL
+        # confidence bounds.
+        # arena: SampleArena to hold the samples, reset here; a new one is
+        # created if None.
         anchor = {'feature': [], 'mean': [], 'precision': [],
-                  'coverage': [], 'examples': [], 'all_precision': 0}
-        _, coverage_data, _ = sample_fn([], coverage_samples, compute_labels=False)
+                  'coverage': [], 'examples': [], 'all_precision': 0,
+                  'status': 'complete'}
+        timed_out = lambda: deadline is not None and deadline.expired()  # noqa
+        if coverage_bits is None:
+            _, coverage_data, _ = sample_fn([], coverage_samples,
+                                            compute_labels=False)
+            coverage_bits = np.packbits(coverage_data.T.astype(bool), axis=1)
         raw_data, data, labels = sample_fn([], max(1, min_samples_start))
+        if arena is None:
+            arena = SampleArena()
+        arena.reset(data.shape[1], raw_data.shape[1], raw_data.dtype)
+        arena.append(raw_data, data, labels)
         mean = labels.mean()
         beta = np.log(1. / delta)
-        lb = AnchorBaseBeam.dlow_bernoulli(mean, beta / data.shape[0])
+        lb = AnchorBaseBeam.dlow_bernoulli(mean, beta / arena.size,
+                                            bisection_iterations)
         while mean > desired_confidence and lb < desired_confidence - epsilon:
-            nraw_data, ndata, nlabels = sample_fn([], batch_size)
-            data = np.vstack((data, ndata))
-            raw_data = np.vstack((raw_data, nraw_data))
-            labels = np.hstack((labels, nlabels))
-            mean = labels.mean()
-            lb = AnchorBaseBeam.dlow_bernoulli(mean, beta / data.shape[0])
+            if timed_out():
+                break
+            arena.append(*sample_fn([], batch_size))
+            mean = arena.labels[:arena.size].mean()
+            lb = AnchorBaseBeam.dlow_bernoulli(mean, beta / arena.size,
+                                                bisection_iterations)
         if lb > desired_confidence:
-            anchor['num_preds'] = data.shape[0]
+            anchor['num_preds'] = arena.size
             anchor['all_precision'] = mean
             return anchor
-        prealloc_size = batch_size * 10000
-        current_idx = data.shape[0]
-        data = np.vstack((data, np.zeros((prealloc_size, data.shape[1]),
-                                         data.dtype)))
-        raw_data = np.vstack(
-            (raw_data, np.zeros((prealloc_size, raw_data.shape[1]),
-                                raw_data.dtype)))
-        labels = np.hstack((labels, np.zeros(prealloc_size, labels.dtype)))
         n_features = data.shape[1]
-        state = {'t_idx': collections.defaultdict(lambda: set()),
+        state = {'t_idx': collections.defaultdict(
+                     lambda: np.zeros(0, np.uint8)),
                  't_nsamples': collections.defaultdict(lambda: 0.),
                  't_positives': collections.defaultdict(lambda: 0.),
-                 'data': data,
-                 'prealloc_size': prealloc_size,
-                 'raw_data': raw_data,
-                 'labels': labels,
-                 'current_idx': current_idx,
+                 'arena': arena,
                  'n_features': n_features,
-                 't_coverage_idx': collections.defaultdict(lambda: set()),
+                 't_coverage_idx': {},
                  't_coverage': collections.defaultdict(lambda: 0.),
-                 'coverage_data': coverage_data,
+                 'coverage_bits': coverage_bits,
+                 'n_coverage': coverage_samples,
                  't_order': collections.defaultdict(lambda: list())
                  }
         current_size = 1
@@ -305,7 +427,11 @@ class AnchorBaseBeam(object):
         t = 1
         if max_anchor_size is None:
             max_anchor_size = n_features
+        status = 'complete'
         while current_size <= max_anchor_size:
+            if timed_out():
+                status = 'timed_out'
+                break
             tuples = AnchorBaseBeam.make_tuples(
                 best_of_size[current_size - 1], state)
             tuples = [x for x in tuples
@@ -317,14 +443,17 @@ class AnchorBaseBeam(object):
             initial_stats = AnchorBaseBeam.get_initial_statistics(tuples,
                                                                   state)
             # print tuples, beam_size
+            arms_sample_fn = (AnchorBaseBeam.get_arms_sample_fn(
+                sample_fn, tuples, state) if batch_arms else None)
             chosen_tuples = AnchorBaseBeam.lucb(
                 sample_fns, initial_stats, epsilon, delta, batch_size,
                 min(beam_size, len(tuples)),
-                verbose=verbose, verbose_every=verbose_every)
+                verbose=verbose, verbose_every=verbose_every,
+                deadline=deadline, arms_sample_fn=arms_sample_fn,
+                bisection_iterations=bisection_iterations)
             best_of_size[current_size] = [tuples[x] for x in chosen_tuples]
             if verbose:
                 print('Best of size ', current_size, ':')
-            # print state['data'].shape[0]
             stop_this = False
             for i, t in zip(chosen_tuples, best_of_size[current_size]):
                 # I can choose at most (beam_size - 1) tuples at each step,
@@ -337,9 +466,11 @@ class AnchorBaseBeam(object):
                 # else:
                 mean = state['t_positives'][t] / state['t_nsamples'][t]
                 lb = AnchorBaseBeam.dlow_bernoulli(
-                    mean, beta / state['t_nsamples'][t])
+                    mean, beta / state['t_nsamples'][t],
+                    bisection_iterations)
                 ub = AnchorBaseBeam.dup_bernoulli(
-                    mean, beta / state['t_nsamples'][t])
+                    mean, beta / state['t_nsamples'][t],
+                    bisection_iterations)
                 coverage = state['t_coverage'][t]
                 if verbose:
                     print(i, mean, lb, ub)
@@ -347,13 +478,18 @@ class AnchorBaseBeam(object):
                        lb < desired_confidence - epsilon_stop) or
                        (mean < desired_confidence and
                         ub >= desired_confidence + epsilon_stop)):
+                    if timed_out():
+                        status = 'timed_out'
+                        break
                     # print mean, lb, state['t_nsamples'][t]
                     sample_fns[i](batch_size)
                     mean = state['t_positives'][t] / state['t_nsamples'][t]
                     lb = AnchorBaseBeam.dlow_bernoulli(
-                        mean, beta / state['t_nsamples'][t])
+                        mean, beta / state['t_nsamples'][t],
+                        bisection_iterations)
                     ub = AnchorBaseBeam.dup_bernoulli(
-                        mean, beta / state['t_nsamples'][t])
+                        mean, beta / state['t_nsamples'][t],
+                        bisection_iterations)
                 if verbose:
                     print('%s mean = %.2f lb = %.2f ub = %.2f coverage: %.2f n: %d' % (t, mean, lb, ub, coverage, state['t_nsamples'][t]))
                 if mean >= desired_confidence and lb > desired_confidence - epsilon_stop:
@@ -368,6 +504,8 @@ class AnchorBaseBeam(object):
             if stop_this:
                 break
             current_size += 1
+        if timed_out():
+            status = 'timed_out'
         if best_tuple == ():
             # Could not find an anchor, will now choose the highest precision
             # amongst the top K from every round
@@ -377,14 +515,21 @@ class AnchorBaseBeam(object):
             for i in range(0, current_size):
                 tuples.extend(best_of_size[i])
             # tuples = best_of_size[current_size - 1]
-            sample_fns = AnchorBaseBeam.get_sample_fns(sample_fn, tuples,
-                                                       state)
-            initial_stats = AnchorBaseBeam.get_initial_statistics(tuples,
-                                                                  state)
-            # print tuples, beam_size
-            chosen_tuples = AnchorBaseBeam.lucb(
-                sample_fns, initial_stats, epsilon, delta, batch_size,
-                1, verbose=verbose)
-            best_tuple = tuples[chosen_tuples[0]]
+            if tuples:
+                sample_fns = AnchorBaseBeam.get_sample_fns(sample_fn, tuples,
+                                                           state)
+                initial_stats = AnchorBaseBeam.get_initial_statistics(tuples,
+                                                                      state)
+                # print tuples, beam_size
+                arms_sample_fn = (AnchorBaseBeam.get_arms_sample_fn(
+                    sample_fn, tuples, state) if batch_arms else None)
+                chosen_tuples = AnchorBaseBeam.lucb(
+                    sample_fns, initial_stats, epsilon, delta, batch_size,
+                    1, verbose=verbose, deadline=deadline,
+                    arms_sample_fn=arms_sample_fn,
+                    bisection_iterations=bisection_iterations)
+                best_tuple = tuples[chosen_tuples[0]]
         # return best_tuple, state
-        return AnchorBaseBeam.get_anchor_from_tuple(best_tuple, state)
\ No newline at end of file
+        anchor = AnchorBaseBeam.get_anchor_from_tuple(best_tuple, state)
+        anchor['status'] = status
+        return anchor
\ No newline at end of file
@@ -27,9 +27,19 @@ class AnchorTabularExplainer(object):
         categorical_names: map from integer to list of strings, names for each
             value of the categorical features. Every feature that is not in
             this map will be considered as ordinal or continuous, and thus discretized.
+        coverage_samples: size of the training sample used to estimate anchor
+            coverage. It is drawn once, with its own random state seeded by
+            coverage_seed, and shared by all explanations.
+        coverage_refresh: redraw the coverage sample every coverage_refresh
+            explanations (never if None)
+        discretizer: 'quartile' or 'decile'. When every feature is
+            categorical, e.g. when the data was loaded with
+            load_csv_dataset(discretize=True), the data is used as is and
+            discretizer may also be None.
     """
     def __init__(self, class_names, feature_names, train_data,
-                 categorical_names={}, discretizer='quartile', encoder_fn=None, beam_size=1):
+                 categorical_names={}, discretizer='quartile', encoder_fn=None, beam_size=1,
+                 coverage_samples=10000, coverage_refresh=None, coverage_seed=1):
         self.min = {}
         self.max = {}
         self.disc = collections.namedtuple('random_name2',
@@ -46,7 +56,15 @@ class AnchorTabularExplainer(object):
         if categorical_names:
             self.categorical_features = sorted(categorical_names.keys())
 
-        if discretizer == 'quartile':
+        self.ordinal_features = [x for x in range(len(feature_names)) if x not in self.categorical_features]
+
+        if not self.ordinal_features:
+            # nothing to discretize, the data is used as is
+            pass
+        elif discretizer is None:
+            raise ValueError('A discretizer is required for the features not in '
+                             'categorical_names: %s' % self.ordinal_features)
+        elif discretizer == 'quartile':
             self.disc = lime.lime_tabular.QuartileDiscretizer(train_data,
                                                          self.categorical_features,
                                                          self.feature_names)
@@ -57,16 +75,56 @@ class AnchorTabularExplainer(object):
         else:
             raise ValueError('Discretizer must be quartile or decile')
 
-        self.ordinal_features = [x for x in range(len(feature_names)) if x not in self.categorical_features]
-
         self.d_train = self.disc.discretize(self.train)
-        self.categorical_names.update(self.disc.names)
+        self.categorical_names.update(getattr(self.disc, 'names', {}))
         self.categorical_features += self.ordinal_features
 
         for f in range(train_data.shape[1]):
             self.min[f] = np.min(train_data[:, f])
             self.max[f] = np.max(train_data[:, f])
 
+        # per ordinal feature, training values sorted by bin, so the values
+        # of a bin range (geq, leq] are a contiguous slice
+        self.bin_pools = {}
+        for f in self.ordinal_features:
+            order = np.argsort(self.d_train[:, f], kind='stable')
+            self.bin_pools[f] = (self.d_train[order, f], train_data[order, f])
+
+        self.coverage_samples = coverage_samples
+        self.coverage_refresh = coverage_refresh
+        self.coverage_rng = np.random.RandomState(coverage_seed)
+        self.refresh_coverage()
+        # sample buffers reused by every explanation
+        self.arena = anchor_base.SampleArena()
+
+    def refresh_coverage(self):
+        """Draws a new discretized coverage sample from the training data"""
+        idx = self.coverage_rng.randint(0, self.train.shape[0],
+                                        self.coverage_samples)
+        self.d_coverage = self.d_train[idx]
+        self.coverage_predicates = {}
+        self.explanations_since_refresh = 0
+
+    def coverage_bits(self, mapping):
+        """Returns one np.packbits row per predicate in mapping, marking the
+        coverage sample rows that satisfy it"""
+        rows = []
+        for i in range(len(mapping)):
+            f, op, v = mapping[i]
+            if (f, op, v) not in self.coverage_predicates:
+                column = self.d_coverage[:, f]
+                if op == 'eq':
+                    satisfied = column == v
+                elif op == 'leq':
+                    satisfied = column <= v
+                else:
+                    satisfied = column > v
+                self.coverage_predicates[(f, op, v)] = np.packbits(satisfied)
+            rows.append(self.coverage_predicates[(f, op, v)])
+        if not rows:
+            return np.zeros((0, (self.coverage_samples + 7) // 8), np.uint8)
+        return np.vstack(rows)
+
 
     def sample_from_train(self, conditions_eq, conditions_neq, conditions_geq,
                           conditions_leq, num_samples):
@@ -75,43 +133,34 @@ class AnchorTabularExplainer(object):
         """
         train = self.train
         d_train = self.d_train
-        idx = np.random.choice(range(train.shape[0]), num_samples,
-                               replace=True)
+        idx = np.random.randint(0, train.shape[0], num_samples)
         sample = train[idx]
-        d_sample = d_train[idx]
+        if conditions_geq or conditions_leq:
+            d_sample = d_train[idx]
         for f in conditions_eq:
             sample[:, f] = np.repeat(conditions_eq[f], num_samples)
-        for f in conditions_geq:
-            idx = d_sample[:, f] <= conditions_geq[f]
+        for f in sorted(set(conditions_geq) | set(conditions_leq)):
+            idx = np.zeros(num_samples, bool)
+            if f in conditions_geq:
+                idx |= d_sample[:, f] <= conditions_geq[f]
             if f in conditions_leq:
-                idx = (idx + (d_sample[:, f] > conditions_leq[f])).astype(bool)
-            if idx.sum() == 0:
+                idx |= d_sample[:, f] > conditions_leq[f]
+            n_replace = idx.sum()
+            if n_replace == 0:
                 continue
-            options = d_train[:, f] > conditions_geq[f]
-            if f in conditions_leq:
-                options = options * (d_train[:, f] <= conditions_leq[f])
-            if options.sum() == 0:
-                min_ = conditions_geq.get(f, self.min[f])
-                max_ = conditions_leq.get(f, self.max[f])
-                to_rep = np.random.uniform(min_, max_, idx.sum())
-            else:
-                to_rep = np.random.choice(train[options, f], idx.sum(),
-                                          replace=True)
-            sample[idx, f] = to_rep
-        for f in conditions_leq:
+            bins, values = self.bin_pools[f]
+            start = 0
+            stop = bins.shape[0]
             if f in conditions_geq:
-                continue
-            idx = d_sample[:, f] > conditions_leq[f]
-            if idx.sum() == 0:
-                continue
-            options = d_train[:, f] <= conditions_leq[f]
-            if options.sum() == 0:
+                start = np.searchsorted(bins, conditions_geq[f], 'right')
+            if f in conditions_leq:
+                stop = np.searchsorted(bins, conditions_leq[f], 'right')
+            if stop <= start:
                 min_ = conditions_geq.get(f, self.min[f])
                 max_ = conditions_leq.get(f, self.max[f])
-                to_rep = np.random.uniform(min_, max_, idx.sum())
+                to_rep = np.random.uniform(min_, max_, n_replace)
             else:
-                to_rep = np.random.choice(train[options, f], idx.sum(),
-                                          replace=True)
+                to_rep = values[np.random.randint(start, stop, n_replace)]
             sample[idx, f] = to_rep
         return sample
 
@@ -230,8 +279,18 @@ class AnchorTabularExplainer(object):
             # names[idx] = '%s = %s' % (
             #     self.feature_names[f],
             #     self.categorical_names[f][int(data_row[f])])
+        # predicate table: data[:, i] is mapping[i] evaluated on the
+        # discretized samples
+        pred_features = np.array([mapping[i][0] for i in range(len(mapping))],
+                                 int)
+        pred_values = np.array([mapping[i][2] for i in range(len(mapping))],
+                               float)
+        pred_ops = np.array([mapping[i][1] for i in range(len(mapping))])
+        pred_eq = pred_ops == 'eq'
+        pred_leq = pred_ops == 'leq'
+        pred_geq = pred_ops == 'geq'
 
-        def sample_fn(present, num_samples, compute_labels=True):
+        def perturb(present, num_samples):
             conditions_eq = {}
             conditions_leq = {}
             conditions_geq = {}
@@ -251,20 +310,35 @@ class AnchorTabularExplainer(object):
             raw_data = self.sample_from_train(
                 conditions_eq, {}, conditions_geq, conditions_leq, num_samples)
             d_raw_data = self.disc.discretize(raw_data)
-            data = np.zeros((num_samples, len(mapping)), int)
-            for i in mapping:
-                f, op, v = mapping[i]
-                if op == 'eq':
-                    data[:, i] = (d_raw_data[:, f] == data_row[f]).astype(int)
-                if op == 'leq':
-                    data[:, i] = (d_raw_data[:, f] <= v).astype(int)
-                if op == 'geq':
-                    data[:, i] = (d_raw_data[:, f] > v).astype(int)
+            columns = d_raw_data[:, pred_features]
+            if pred_eq.all():
+                data = columns == pred_values
+            else:
+                data = (((columns == pred_values) & pred_eq) |
+                        ((columns <= pred_values) & pred_leq) |
+                        ((columns > pred_values) & pred_geq))
+            data = data.astype(int)
             # data = (raw_data == data_row).astype(int)
+            return raw_data, data
+
+        def sample_fn(present, num_samples, compute_labels=True):
+            raw_data, data = perturb(present, num_samples)
             labels = []
             if compute_labels:
                 labels = (predict_fn(raw_data) == true_label).astype(int)
             return raw_data, data, labels
+
+        def batch_sample_fn(requests):
+            # requests is a list of (present, num_samples); the samples of all
+            # requests are labelled with a single classifier call
+            samples = [perturb(present, num_samples)
+                       for present, num_samples in requests]
+            raw_data = np.vstack([x[0] for x in samples])
+            labels = (predict_fn(raw_data) == true_label).astype(int)
+            splits = np.cumsum([x[0].shape[0] for x in samples])[:-1]
+            return [(raw, data, label) for (raw, data), label
+                    in zip(samples, np.split(labels, splits))]
+        sample_fn.batch = batch_sample_fn
         return sample_fn, mapping
 
     def explain_instance(self, data_row, classifier_fn, threshold=0.95,
@@ -275,12 +349,18 @@ class AnchorTabularExplainer(object):
         # It's possible to pass in max_anchor_size
         sample_fn, mapping = self.get_sample_fn(
             data_row, classifier_fn, desired_label=desired_label)
+        if (self.coverage_refresh is not None and
+                self.explanations_since_refresh >= self.coverage_refresh):
+            self.refresh_coverage()
+        self.explanations_since_refresh += 1
         # return sample_fn, mapping
         exp = anchor_base.AnchorBaseBeam.anchor_beam(
             sample_fn, delta=delta, epsilon=tau, batch_size=batch_size,
             desired_confidence=threshold, max_anchor_size=max_anchor_size,
             beam_size=self.beam_size,
-            **kwargs)
+            coverage_samples=self.coverage_samples,
+            coverage_bits=self.coverage_bits(mapping),
+            arena=self.arena, **kwargs)
         self.add_names_to_exp(data_row, exp, mapping)
         exp['instance'] = data_row
         exp['prediction'] = classifier_fn(self.encoder_fn(data_row.reshape(1, -1)))[0]
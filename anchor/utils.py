@@ -1,6 +1,7 @@
 """bla"""
 # from __future__ import print_function
 import copy
+import json
 import sklearn
 import numpy as np
 import lime
@@ -8,6 +9,7 @@ import lime.lime_tabular
 # import string
 import os
 import sys
+from utils.fingerprint import file_digest, fingerprint
 
 class Bunch(object):
     """bla"""
@@ -29,10 +31,27 @@ def load_csv_dataset(data, target_idx, delimiter=',',
                      feature_names=None, categorical_features=None,
                      features_to_use=None, feature_transformations=None,
                      test_size=.2,
-                     discretize=False, balance=False, fill_na='-1', filter_fn=None, skip_first=True):
+                     discretize=False, balance=False, fill_na='-1', filter_fn=None, skip_first=True,
+                     cache_dir=None, data_digest=None):
     """if not feature names, takes 1st line as feature names
     if not features_to_use, use all except for target
-    if not categorical_features, consider everything < 20 as categorical"""
+    if not categorical_features, consider everything < 20 as categorical
+    if cache_dir, the encoded splits are stored there as .npz plus a JSON
+    sidecar, keyed by the file content and the arguments, and reloaded
+    without parsing (not used with feature_transformations, filter_fn or
+    balance); data_digest is the file_digest of data, when already known"""
+    cache_key = None
+    if (cache_dir is not None and isinstance(data, (str, os.PathLike)) and
+            not feature_transformations and filter_fn is None and not balance):
+        if data_digest is None:
+            data_digest = file_digest(data)
+        cache_key = dataset_cache_key(
+            data_digest, target_idx, delimiter, feature_names, categorical_features,
+            features_to_use, test_size, discretize, fill_na, skip_first)
+        ret = load_cached_dataset(cache_dir, cache_key)
+        if ret is not None:
+            np.random.seed(1)
+            return ret
     if feature_transformations is None:
         feature_transformations = {}
     try:
@@ -140,4 +159,59 @@ def load_csv_dataset(data, target_idx, delimiter=',',
     ret.validation_idx = cv_idx
     ret.train_idx = train_idx
     ret.data = data
+    if cache_key is not None:
+        save_cached_dataset(cache_dir, cache_key, ret)
+    return ret
+
+
+CACHED_ARRAYS = ['data', 'labels', 'train', 'labels_train', 'validation',
+                 'labels_validation', 'test', 'labels_test', 'train_idx',
+                 'validation_idx', 'test_idx']
+
+
+def dataset_cache_key(data_digest, *args):
+    """Hash of the file content digest and the load arguments"""
+    return fingerprint('dataset', data_digest, args)
+
+
+def save_cached_dataset(cache_dir, key, dataset):
+    os.makedirs(cache_dir, exist_ok=True)
+    base = os.path.join(cache_dir, key)
+    arrays = dict((x, getattr(dataset, x)) for x in CACHED_ARRAYS)
+    arrays['class_names'] = np.array(dataset.class_names)
+    arrays['feature_names'] = np.array(dataset.feature_names)
+    arrays['class_target'] = np.array([dataset.class_target])
+    sidecar = {
+        'categorical_names': dict((str(k), list(v)) for k, v in
+                                  dataset.categorical_names.items()),
+        'categorical_features': [int(x) for x in dataset.categorical_features],
+        'ordinal_features': [int(x) for x in dataset.ordinal_features],
+    }
+    # both files are replaced atomically, the sidecar first, so a reader
+    # that finds the .npz also finds a complete sidecar
+    tmp = '%s.%d.tmp' % (base, os.getpid())
+    with open(tmp + '.json', 'w') as f:
+        json.dump(sidecar, f)
+    os.replace(tmp + '.json', base + '.json')
+    np.savez(tmp + '.npz', **arrays)
+    os.replace(tmp + '.npz', base + '.npz')
+
+
+def load_cached_dataset(cache_dir, key):
+    base = os.path.join(cache_dir, key)
+    if not (os.path.exists(base + '.npz') and os.path.exists(base + '.json')):
+        return None
+    with open(base + '.json') as f:
+        sidecar = json.load(f)
+    ret = Bunch({})
+    with np.load(base + '.npz') as arrays:
+        for x in CACHED_ARRAYS:
+            setattr(ret, x, arrays[x])
+        ret.class_names = list(arrays['class_names'])
+        ret.feature_names = arrays['feature_names'].tolist()
+        ret.class_target = arrays['class_target'].tolist()[0]
+    ret.categorical_names = dict((int(k), v) for k, v in
+                                 sidecar['categorical_names'].items())
+    ret.categorical_features = sidecar['categorical_features']
+    ret.ordinal_features = sidecar['ordinal_features']
     return ret
@@ -1,16 +1,13 @@
 import os
 import json
 import logging
-import multiprocessing
-from flask import Flask, render_template, request, jsonify
-from logger import Logger
-from bfs_amcc_runner import run_bfs_amcc
+import threading
+from flask import Flask, Response, render_template, request, jsonify
+from job_service import JobService
 
 app = Flask(__name__)
 app.logger.setLevel(logging.INFO)
 
-log = Logger()
-
 
 @app.route('/', methods=['GET'])
 def index():
@@ -29,23 +26,17 @@ def index():
         return "Error loading the page", 500
 
 
-@app.route('/log', methods=['GET'])
-def get_logs():
-    try:
-        logs = log.collect()
-        return jsonify(logs)
-    except Exception as e:
-        app.logger.error(f"Error fetching logs: {e}", exc_info=True)
-        return "Error fetching logs", 500
+job_service = None
+job_service_lock = threading.Lock()
 
 
-def worker(config, return_dict):
-    try:
-        result = run_bfs_amcc(config)
-        return_dict['result'] = result
-    except Exception as e:
-        app.logger.error(f"Error processing BFS-AMCC: {e}", exc_info=True)
-        return_dict['error'] = str(e)
+def get_job_service():
+    global job_service
+    with job_service_lock:
+        if job_service is None:
+            config = load_config('config/bfs_amcc_config.json')
+            job_service = JobService(max_workers=config.get("service_workers", 2))
+        return job_service
 
 
 @app.route('/run', methods=['POST'])
@@ -53,29 +44,67 @@ def run_amcc():
     try:
         body = request.form
         config = validate_and_extract_config(body)
+        job_id = get_job_service().submit(config)
+        return jsonify(status='submitted', job_id=job_id)
 
-        manager = multiprocessing.Manager()
-        return_dict = manager.dict()
+    except ValueError as ve:
+        return jsonify(status='fail', message=str(ve))
+    except Exception as e:
+        app.logger.error(f"Error in run_amcc route: {e}", exc_info=True)
+        return jsonify(status='fail', message="An unexpected error occurred.")
 
-        p = multiprocessing.Process(target=worker, args=(config, return_dict))
-        p.start()
-        p.join()
 
-        if 'error' in return_dict:
-            return jsonify(status='fail', message=return_dict['error'])
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    state = get_job_service().status(job_id)
+    if state is None:
+        return jsonify(status='fail', message="Unknown job."), 404
+    return jsonify(status=state, job_id=job_id)
 
-        results = return_dict.get('result', None)
 
-        if results:
-            return jsonify(status='success', messages=results["messages"], metrics=results["metrics"])
-        else:
-            return jsonify(status='fail', message="Processing failed!")
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    service = get_job_service()
+    if service.status(job_id) is None:
+        return jsonify(status='fail', message="Unknown job."), 404
 
-    except ValueError as ve:
-        return jsonify(status='fail', message=str(ve))
+    # a reconnecting EventSource sends the id of the last event it received
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', ''))
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+
+    def stream():
+        for item in service.events(job_id, last_event_id=last_event_id):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, event = item
+            id_line = f"id: {event_id}\n" if event_id is not None else ""
+            yield f"{id_line}event: {event.get('event', 'result')}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    service = get_job_service()
+    state = service.status(job_id)
+    if state is None:
+        return jsonify(status='fail', message="Unknown job."), 404
+    if state in ('pending', 'running'):
+        return jsonify(status=state, job_id=job_id), 202
+    if state == 'cancelled':
+        return jsonify(status='fail', message="Job was cancelled.")
+
+    try:
+        results = service.result(job_id)
     except Exception as e:
-        app.logger.error(f"Error in run_amcc route: {e}", exc_info=True)
-        return jsonify(status='fail', message="An unexpected error occurred.")
+        app.logger.error(f"Error processing BFS-AMCC: {e}", exc_info=True)
+        return jsonify(status='fail', message=str(e))
+
+    if results:
+        return jsonify(status='success', messages=results["messages"], metrics=results["metrics"])
+    else:
+        return jsonify(status='fail', message="Processing failed!")
 
 
 def validate_and_extract_config(body):
@@ -1,16 +1,69 @@
 from ml_model.dataset_loader import DatasetLoader
+from ml_model.memoized_predictor import MemoizedPredictor
 from ml_model.ml_model import ML_Model
 from amcc.bfs_amcc_modifier import BFSAMCCModifier
-from utils.timing import Timeout
+from utils.disk_cache import DiskCache
+from utils.fingerprint import fingerprint
+from utils.result_writer import RESULT_COLUMNS, result_writer_class
+from utils.timing import Deadline
+from collections import OrderedDict
 import numpy as np
-import pandas as pd
-from anchor import anchor_tabular
+from anchor import anchor_explanation, anchor_tabular
 from logger import Logger
+import multiprocessing
+import operator
+import os
+import re
 
 log = Logger()
 
 
-def parse_transition_rules(transition_rules, feature_names):
+TRANSITION_OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt
+}
+
+TRANSITION_CONDITION = re.compile(r"^\s*(old|new|-?\d+)\s*(>=|<=|==|!=|>|<)\s*(old|new|-?\d+)\s*$")
+
+
+def compile_transition_rule(rule, n_values):
+    """
+    Compiles a transition rule string into an `n_values x n_values` boolean matrix.
+
+    A rule is one or more conditions joined with "AND". Each condition compares two operands with
+    one of >=, <=, ==, !=, > or <, where an operand is `old` (the current value), `new` (the proposed
+    value) or an integer category code, e.g. "old >= new AND new != 0".
+
+    Parameters:
+    ----------
+    rule : str
+        The transition rule.
+    n_values : int
+        Number of categorical values of the feature.
+
+    Returns:
+    -------
+    numpy.ndarray
+        Boolean matrix where entry `[old, new]` tells whether the transition from `old` to `new` is allowed.
+    """
+    grid = {"old": np.arange(n_values)[:, None], "new": np.arange(n_values)[None, :]}
+    allowed = np.ones((n_values, n_values), dtype=bool)
+    for condition in re.split(r"\s+AND\s+", rule.strip()):
+        match = TRANSITION_CONDITION.match(condition)
+        if match is None:
+            raise ValueError(f"Unknown transition rule '{rule}': cannot parse condition '{condition}'.")
+        left, op, right = match.groups()
+        left = grid[left] if left in grid else int(left)
+        right = grid[right] if right in grid else int(right)
+        allowed &= TRANSITION_OPERATORS[op](left, right)
+    return allowed
+
+
+def parse_transition_rules(transition_rules, feature_names, categorical_names):
     """
     Parses transition rules from a given dictionary and maps feature names to their corresponding indices.
 
@@ -19,34 +72,154 @@ def parse_transition_rules(transition_rules, feature_names):
     transition_rules : dict
         Dictionary containing transition rules for specific features.
     feature_names : list
-        List of feature names in the dataset.
+        List of feature names in the dataset, without the target.
+    categorical_names : dict
+        A dictionary where keys are feature indices and values are the possible categorical values
+        for that feature.
 
     Returns:
     -------
     dict
-        A dictionary where keys are feature indices and values are lambda functions representing
-        the respective transition rules.
-    """
-    condition_map = {
-        "old >= new": lambda old, new: old >= new,
-        "old <= new": lambda old, new: old <= new,
-        "old == new": lambda old, new: old == new,
-        "old != new": lambda old, new: old != new,
-        "old > new": lambda old, new: old > new,
-        "old < new": lambda old, new: old < new
-    }
+        A dictionary where keys are feature indices and values are boolean matrices of allowed
+        `[old, new]` transitions, as returned by `compile_transition_rule`.
 
+    Raises:
+    ------
+    ValueError
+        If a feature is unknown or not categorical, or a rule cannot be parsed.
+    """
     rules = {}
     for feature, rule in transition_rules.items():
-        if rule in condition_map:
-            idx = feature_names.index(feature)
-            rules[idx] = condition_map[rule]
+        if feature not in feature_names:
+            raise ValueError(f"Unknown feature '{feature}' in transition rules.")
+        idx = feature_names.index(feature)
+        if idx not in categorical_names:
+            raise ValueError(f"Transition rule for non-categorical feature '{feature}'")
+        rules[idx] = compile_transition_rule(rule, len(categorical_names[idx]))
 
     return rules
 
 
+def transition_rules_fingerprint(transition_rules):
+    """
+    Returns a fingerprint of compiled transition rules (see `parse_transition_rules`), or of None.
+    """
+    if transition_rules is None:
+        return fingerprint(None)
+    return fingerprint(sorted((int(idx), matrix.tolist()) for idx, matrix in transition_rules.items()))
+
+
+# Config entries that `build_context` depends on.
+CONTEXT_KEYS = ("data_path", "target_idx", "delimiter", "feature_names", "beam_size", "transition_rules",
+                "search_strategy", "max_batch_size", "packed_states", "model_dir", "compiled_model",
+                "dataset_cache_dir", "explanation_cache", "explanation_cache_path", "explanation_cache_size",
+                "explanation_cache_max_bytes", "prediction_cache", "prediction_cache_size", "search_cache",
+                "search_cache_path", "search_cache_size", "search_cache_max_bytes")
+MAX_WARM_CONTEXTS = 4
+
+# Contexts kept alive by long-running processes, keyed by `context_key`, least recently used first.
+_warm_contexts = OrderedDict()
+
+
+def context_key(config):
+    """
+    Returns a key identifying the dataset, model, explainer and modifier built for `config`.
+    """
+    return fingerprint({key: config.get(key) for key in CONTEXT_KEYS},
+                       os.path.getmtime(config["data_path"]))
+
+
+def build_context(config, reuse=False):
+    """
+    Loads the dataset and builds the model, explainer and modifier described by `config`.
+
+    Parameters:
+    ----------
+    config : dict
+        Configuration dictionary, as passed to `run_bfs_amcc`.
+    reuse : bool, optional
+        Reuse a context built earlier in this process for an equivalent config, and keep this one for
+        later runs. Up to `MAX_WARM_CONTEXTS` contexts are kept.
+
+    Returns:
+    -------
+    dict
+        The config, dataset, predictor, explainer and modifier of the run, and the explanation cache
+        (None unless `config["explanation_cache"]` is set). The predictor is wrapped in a
+        `MemoizedPredictor` when `config["prediction_cache"]` is set. When `config["search_cache"]` is
+        set, 'search_cache' holds the cache of `bfs_amcc` outcomes and 'search_fingerprint' a fingerprint
+        of everything besides the instance that the outcome depends on.
+    """
+    key = context_key(config) if reuse else None
+    if key in _warm_contexts:
+        _warm_contexts.move_to_end(key)
+        return dict(_warm_contexts[key], config=config)
+
+    dataset_loader = DatasetLoader(config["data_path"], config["target_idx"], delimiter=config["delimiter"],
+                                   feature_names=config["feature_names"],
+                                   cache_dir=config.get("dataset_cache_dir"))
+    predictor = ML_Model(dataset_loader.dataset, artifact_dir=config.get("model_dir"),
+                         data_fingerprint=dataset_loader.fingerprint,
+                         compiled=config.get("compiled_model", True))
+    if config.get("prediction_cache", False):
+        predictor = MemoizedPredictor(predictor, max_entries=config.get("prediction_cache_size", 65536))
+    explainer = anchor_tabular.AnchorTabularExplainer(
+        dataset_loader.dataset.class_names,
+        dataset_loader.dataset.feature_names,
+        dataset_loader.dataset.train,
+        dataset_loader.dataset.categorical_names,
+    beam_size=config["beam_size"])
+
+    categorical_names = dataset_loader.dataset.categorical_names
+
+    # If transition_rules parameter is None, try to parse it from the config. Rules index the dataset's
+    # columns, so they are resolved against its feature names, which do not include the target.
+    if "transition_rules" in config:
+        transition_rules_str = config["transition_rules"]
+        transition_rules = parse_transition_rules(transition_rules_str, dataset_loader.dataset.feature_names,
+                                                  categorical_names)
+    else:
+        transition_rules = None
+    modifier = BFSAMCCModifier(dataset_loader, predictor, explainer, transition_rules,
+                               search_strategy=config.get("search_strategy", "bfs"),
+                               max_batch_size=config.get("max_batch_size", 1024),
+                               packed_states=config.get("packed_states", True))
+
+    explanation_cache = None
+    if config.get("explanation_cache", False):
+        explanation_cache = DiskCache(config.get("explanation_cache_path"),
+                                      max_entries=config.get("explanation_cache_size", 1024),
+                                      max_bytes=config.get("explanation_cache_max_bytes"))
+
+    search_cache = None
+    search_fingerprint = None
+    if config.get("search_cache", False):
+        search_cache = DiskCache(config.get("search_cache_path"),
+                                 max_entries=config.get("search_cache_size", 4096),
+                                 max_bytes=config.get("search_cache_max_bytes"))
+        search_fingerprint = fingerprint(transition_rules_fingerprint(transition_rules),
+                                         predictor.model_fingerprint, modifier.search_strategy,
+                                         modifier.max_batch_size)
+
+    context = {
+        "config": config,
+        "dataset": dataset_loader.dataset,
+        "predictor": predictor,
+        "explainer": explainer,
+        "modifier": modifier,
+        "explanation_cache": explanation_cache,
+        "search_cache": search_cache,
+        "search_fingerprint": search_fingerprint
+    }
+    if reuse:
+        _warm_contexts[key] = context
+        while len(_warm_contexts) > MAX_WARM_CONTEXTS:
+            _warm_contexts.popitem(last=False)
+    return context
+
+
 # @time_it
-def run_bfs_amcc(config):
+def run_bfs_amcc(config, reuse_context=False, on_result=None):
     """
         Runs the Breadth-First Search process based on "Achievable Minimally Contrastive Counterfactual Explanations"
         on instances labeled suboptimal. The goal is to modify these instances in a way that changes their prediction
@@ -57,6 +230,12 @@ def run_bfs_amcc(config):
         config : dict
             Configuration dictionary containing parameters and paths related to the dataset,
             machine learning model, and the counterfactual explanation process.
+        reuse_context : bool, optional
+            Reuse the dataset, model and explainer built by an earlier run in this process
+            (see `build_context`).
+        on_result : callable, optional
+            Called with a JSON-serialisable summary of each instance as soon as it is processed
+            (see `result_event`).
 
         Returns:
         -------
@@ -64,92 +243,297 @@ def run_bfs_amcc(config):
             A dictionary containing:
             - 'metrics': A dictionary with results of the process (success, failure, time taken, etc.).
             - 'messages': A list of log messages generated during the process.
+            - 'explanation_cache': Hits and lookups of the explanation cache.
+            - 'search_cache': Hits and lookups of the search cache.
+            'metrics' and 'messages' stay empty when `config["keep_results"]` is false; results are then only written to
+            `config["output_file"]`, one row at a time.
     """
 
-    dataset_loader = DatasetLoader(config["data_path"], config["target_idx"], delimiter=config["delimiter"],
-                                   feature_names=config["feature_names"])
-    predictor = ML_Model(dataset_loader.dataset)
-    explainer = anchor_tabular.AnchorTabularExplainer(
-        dataset_loader.dataset.class_names,
-        dataset_loader.dataset.feature_names,
-        dataset_loader.dataset.train,
-        dataset_loader.dataset.categorical_names,
-    beam_size=config["beam_size"])
+    context = build_context(config, reuse=reuse_context)
+    dataset = context["dataset"]
 
-    # If transition_rules parameter is None, try to parse it from the config
-    feature_names = config["feature_names"]
-    if "transition_rules" in config:
-        transition_rules_str = config["transition_rules"]
-        transition_rules = parse_transition_rules(transition_rules_str, feature_names)
-    else:
-        transition_rules = None
-    modifier = BFSAMCCModifier(dataset_loader, predictor, explainer, transition_rules)
+    output_file = config["output_file"]
+    writer_class = result_writer_class(output_file)
+    resume = config.get("resume", False)
+    keep_results = config.get("keep_results", True)
 
-    categorical_names = dataset_loader.dataset.categorical_names
+    metrics = {column: [] for column in RESULT_COLUMNS}
+    messages = []  # For collecting logs to send to frontend
+    explanation_cache = {"hits": 0, "lookups": 0}
+    search_cache = {"hits": 0, "lookups": 0}
+
+    completed_indices = writer_class.completed_indices(output_file) if resume else set()
+    suboptimal_indices = [int(i) for i in np.where(dataset.labels_test == 1)[0] if i not in completed_indices]
+    if completed_indices:
+        log.log_info(f"Resuming: skipping {len(completed_indices)} instances already in {output_file}.")
+
+    with writer_class(output_file, resume=resume, flush_every=config.get("flush_every", 10)) as writer:
+        for result in _iter_results(context, suboptimal_indices, config.get("n_workers", 1)):
+            if result is None:
+                continue
+            if context["explanation_cache"] is not None:
+                explanation_cache["lookups"] += 1
+                explanation_cache["hits"] += result["explanation_cached"]
+            if context["search_cache"] is not None:
+                search_cache["lookups"] += 1
+                search_cache["hits"] += result["search_cached"]
+            row = result_row(result)
+            writer.write(row)
+            log.log_info(f"Visited states: {row['visited_misses']} queued, "
+                         f"{row['visited_hits']} duplicates skipped, "
+                         f"{row['nodes_expanded']} expanded.")
+            for message in result["messages"]:
+                log.log_info(message)
+            if keep_results:
+                for column in RESULT_COLUMNS:
+                    metrics[column].append(row[column])
+                messages.extend(result["messages"])
+            if on_result is not None:
+                on_result(result_event(result))
+    for cache in (context["explanation_cache"], context["search_cache"]):
+        if cache is not None:
+            cache.flush()
+
+    if explanation_cache["lookups"]:
+        log.log_info(f"Explanation cache: {explanation_cache['hits']} hits out of "
+                     f"{explanation_cache['lookups']} lookups.")
+    if search_cache["lookups"]:
+        log.log_info(f"Search cache: {search_cache['hits']} hits out of {search_cache['lookups']} lookups.")
+
+    return {"metrics": metrics, "messages": messages, "explanation_cache": explanation_cache,
+            "search_cache": search_cache}
+
+
+def result_row(result):
+    """
+    Flattens a `_process_instance` result into an output row with the `RESULT_COLUMNS` fields.
+    """
+    row = {
+        "instance_index": result["instance_index"],
+        "success": result["success"],
+        "failure": 1 - result["success"],
+        "time": result["time"],
+        "status": result["status"],
+        "modified_instances": result["modified_instance"],
+        "changes": result["changes"]
+    }
+    for key in ("visited_hits", "visited_misses", "nodes_scored", "nodes_expanded"):
+        row[key] = result["stats"][key]
+    return row
+
+
+def result_event(result):
+    """
+    Summarises a `_process_instance` result for progress reporting.
+    """
+    return {
+        "instance_index": result["instance_index"],
+        "status": result["status"],
+        "success": result["success"],
+        "changes": result["changes"],
+        "time": result["time"],
+        "nodes_scored": result["stats"]["nodes_scored"],
+        "nodes_expanded": result["stats"]["nodes_expanded"],
+        "messages": result["messages"]
+    }
+
+
+# Run state shared with `_process_instance`. Pool workers receive it once, through `_init_worker`.
+_context = {}
+
+
+def _init_worker(context, single_threaded_model=True):
+    """
+    Installs the shared run context in the current process.
+
+    Parameters:
+    ----------
+    context : dict
+        The config, dataset, predictor, explainer and modifier of the run.
+    single_threaded_model : bool, optional
+        Restricts the forest to one job so pool workers do not oversubscribe the CPU.
+    """
+    _context.clear()
+    _context.update(context)
+    if single_threaded_model:
+        _context["predictor"].classifier.n_jobs = 1
+
+
+def _init_worker_from_config(config):
+    """
+    Builds the run context for `config` in the current process and installs it (see `_init_worker`).
+    """
+    _init_worker(build_context(config))
+
+
+def _worker_pool(context, n_workers):
+    """
+    Returns a pool of `n_workers` processes with `context` installed in each.
+
+    The explainer and modifier cannot be pickled, so the context is inherited through the 'fork' start
+    method wherever it is available, whatever the platform default is. Elsewhere (Windows) the workers use
+    'spawn' and each rebuilds the context from the config, so set `model_dir` there to load one fitted model
+    instead of training one per worker.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork").Pool(n_workers, initializer=_init_worker,
+                                                         initargs=(context,))
+    return multiprocessing.get_context("spawn").Pool(n_workers, initializer=_init_worker_from_config,
+                                                      initargs=(context["config"],))
+
+
+def _iter_results(context, instance_indices, n_workers=1):
+    """
+    Yields `_process_instance` results in the order of `instance_indices`, processing them in a pool of
+    `n_workers` processes (see `_worker_pool`) when `n_workers` is greater than 1.
+    """
+    if n_workers <= 1:
+        _init_worker(context, single_threaded_model=False)
+        for instance_index in instance_indices:
+            yield _process_instance(instance_index)
+        return
+
+    with _worker_pool(context, n_workers) as pool:
+        yield from pool.imap(_process_instance, instance_indices)
+
+
+def _process_instance(instance_index):
+    """
+    Explains one test instance and searches for its counterfactual.
+
+    The global NumPy random state is seeded from the config seed and `instance_index`, so the result
+    does not depend on which process handles the instance or in which order.
+
+    Parameters:
+    ----------
+    instance_index : int
+        Index of the instance in the test split.
 
+    Returns:
+    -------
+    dict or None
+        The outcome for the instance, or None if it is not predicted suboptimal. Its 'status' is 'found',
+        'exhausted' or 'timed_out', following `BFSAMCCModifier.stats`.
+    """
+    config = _context["config"]
+    dataset = _context["dataset"]
+    predictor = _context["predictor"]
+    explainer = _context["explainer"]
+    feature_names = config["feature_names"]
     ignore_indices = config["ignore_indices"]
 
-    metrics = {
-        "success": [],
-        "failure": [],
-        "time": [],
-        "modified_instances": [],
-        "changes": []
+    np.random.seed(config.get("random_seed", 1) + instance_index)
+
+    original_instance = dataset.test[instance_index]
+    original_prediction = predictor.predict(original_instance.reshape(1, -1))[0]
+    if original_prediction != 1:
+        return None
+
+    exp, explanation_cached = _explain_instance(original_instance, original_prediction)
+    feature_indices = BFSAMCCModifier.extract_features(" AND ".join(exp.names()))
+    specific_indices = [feature_names.index(feature) for feature in feature_indices if
+                        feature_names.index(feature) not in ignore_indices]
+
+    modified_instance, stats, elapsed_time, search_cached = _search_instance(
+        original_instance, original_prediction, specific_indices, ignore_indices)
+
+    result = {
+        "instance_index": instance_index,
+        "time": elapsed_time,
+        "status": stats["status"],
+        "stats": stats,
+        "explanation_cached": explanation_cached,
+        "search_cached": search_cached,
+        "success": 0,
+        "modified_instance": None,
+        "changes": None,
+        "messages": []
     }
-    messages = []  # For collecting logs to send to frontend
+    if modified_instance is not None:
+        changes_for_instance = {feature_names[i]: (float(original_instance[i]), float(modified_instance[i]))
+                                for i in np.where(original_instance != modified_instance)[0]}
+        result["success"] = 1
+        result["modified_instance"] = modified_instance.tolist()
+        result["changes"] = changes_for_instance
+        result["messages"] = ["Successful modification.", f"Modified Instances: {changes_for_instance}"]
+    elif stats["status"] == "timed_out":
+        result["messages"] = ["Failed modification: search timed out."]
+    else:
+        result["messages"] = ["Failed modification."]
+    return result
+
+
+def _search_instance(instance, prediction, specific_indices, ignore_indices):
+    """
+    Runs `bfs_amcc` on `instance` within `config["bfs_timeout"]` seconds, or returns its outcome from the
+    search cache.
+
+    The cache key is the instance with its prediction, `specific_indices` in order (their order decides
+    which of several minimal counterfactuals is found), the set of `ignore_indices` and the run's
+    `search_fingerprint`, which covers the fitted model's `model_fingerprint`. A cached counterfactual that
+    does not change the current prediction is ignored and searched for again. Timed-out searches are not
+    cached.
+
+    Returns:
+    -------
+    tuple
+        The counterfactual instance (None if none was found), the search stats, the time taken in seconds
+        and whether the outcome came from the cache.
+    """
+    config = _context["config"]
+    dataset = _context["dataset"]
+    predictor = _context["predictor"]
+    modifier = _context["modifier"]
+    cache = _context["search_cache"]
+
+    if cache is not None:
+        key = fingerprint("search", _context["search_fingerprint"], instance.tolist(), int(prediction),
+                          [int(i) for i in specific_indices], sorted(int(i) for i in ignore_indices))
+        with Deadline(None) as lookup:
+            outcome = cache.get(key)
+            modified_instance = None
+            if outcome is not None and outcome["modified_instance"] is not None:
+                modified_instance = np.array(outcome["modified_instance"], dtype=instance.dtype)
+                if predictor.predict(modified_instance.reshape(1, -1))[0] == prediction:
+                    outcome = None
+        if outcome is not None:
+            return modified_instance, dict(outcome["stats"]), lookup.elapsed_time, True
+
+    with Deadline(config.get("bfs_timeout", 5)) as deadline:
+        modified_instance = modifier.bfs_amcc(instance, prediction, dataset.categorical_names, specific_indices,
+                                              ignore_indices, deadline=deadline)
+    stats = dict(modifier.stats)
+    if cache is not None and stats["status"] != "timed_out":
+        cache.put(key, {"modified_instance": None if modified_instance is None else modified_instance.tolist(),
+                        "stats": stats})
+    return modified_instance, stats, deadline.elapsed_time, False
+
+
+def _explain_instance(instance, prediction):
+    """
+    Returns the anchor explanation of `instance` and whether it came from the explanation cache.
+
+    Cached explanations are keyed by the discretised instance, the predicted label, the precision
+    threshold, the beam size and the fitted model's `model_fingerprint`; explanations that timed out are not
+    cached.
+    """
+    config = _context["config"]
+    predictor = _context["predictor"]
+    explainer = _context["explainer"]
+    cache = _context["explanation_cache"]
 
-    suboptimal_indices = np.where(dataset_loader.dataset.labels_test == 1)[0]
-
-    for instance_index in suboptimal_indices:
-        original_instance = dataset_loader.dataset.test[instance_index]
-        original_prediction = predictor.classifier.predict(original_instance.reshape(1, -1))[0]
-
-        if original_prediction == 1:
-            exp = explainer.explain_instance(original_instance, predictor.classifier.predict,
-                                             threshold=config["thresh_prob"])
-            feature_indices = BFSAMCCModifier.extract_features(" AND ".join(exp.names()))
-            specific_indices = [feature_names.index(feature) for feature in feature_indices if
-                                feature_names.index(feature) not in ignore_indices]
-
-            timeout_checker = Timeout(5)
-            with timeout_checker:
-                try:
-                    modified_instance = modifier.bfs_amcc(original_instance, original_prediction,
-                                                          categorical_names, specific_indices, ignore_indices)
-                except TimeoutError as e:
-                    print(e)
-                    continue
-            elapsed = timeout_checker.elapsed_time
-            if elapsed is not None:
-                metrics["time"].append(elapsed)
-
-            if modified_instance is not None:
-                metrics["success"].append(1)
-                metrics["failure"].append(0)
-                success_message = "Successful modification."
-                log.log_info(success_message)
-                messages.append(success_message)
-                metrics["modified_instances"].append(modified_instance)
-                changes_for_instance = {feature_names[i]: (original_instance[i], modified_instance[i])
-                                        for i in np.where(original_instance != modified_instance)[0]}
-                metrics["changes"].append(changes_for_instance)
-                changes_message = f"Modified Instances: {changes_for_instance}"
-                log.log_info(changes_message)
-                messages.append(changes_message)
-            else:
-                metrics["success"].append(0)
-                metrics["failure"].append(1)
-                failure_message = "Failed modification."
-                log.log_info(failure_message)
-                messages.append(failure_message)
-                metrics["modified_instances"].append(None)
-                metrics["changes"].append(None)
-
-    metrics["modified_instances"] = [instance.tolist() if instance is not None else None for instance in
-                                     metrics["modified_instances"]]
-
-    results_df = pd.DataFrame(metrics)
-    results_df.to_csv(config["output_file"], index=False)
-
-    return {"metrics": metrics, "messages": messages}
+    if cache is not None:
+        key = fingerprint("explanation", explainer.disc.discretize(instance.reshape(1, -1))[0].tolist(),
+                          int(prediction), config["thresh_prob"], explainer.beam_size,
+                          predictor.model_fingerprint)
+        exp_map = cache.get(key)
+        if exp_map is not None:
+            exp_map = dict(exp_map, instance=instance)
+            return anchor_explanation.AnchorExplanation('tabular', exp_map, explainer.as_html), True
 
+    exp = explainer.explain_instance(instance, predictor.predict,
+                                     threshold=config["thresh_prob"],
+                                     deadline=Deadline(config.get("explain_timeout")))
+    if cache is not None and exp.exp_map.get("status") != "timed_out":
+        cache.put(key, exp.exp_map)
+    return exp, False
@@ -0,0 +1,225 @@
+import multiprocessing
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from bfs_amcc_runner import run_bfs_amcc
+
+
+class EventPublisher:
+    """
+    Puts progress events on a bounded queue.
+
+    Until `attached` is set by a reader, events are dropped without blocking once the queue is full, so
+    a job whose client only polls its status never waits on the queue. After that, a full queue blocks the
+    producer for up to `put_timeout` seconds, so a slow reader slows the job down instead of growing the
+    buffer. If the reader does not catch up in time, it is treated as gone: events are dropped without
+    blocking until the queue has room again.
+    """
+
+    def __init__(self, events, put_timeout=5.0, attached=None):
+        self.events = events
+        self.put_timeout = put_timeout
+        self.attached = attached
+        self.stalled = False
+        self.dropped = 0
+
+    def _reader_attached(self):
+        if self.attached is None:
+            return True
+        if self.attached.is_set():
+            # readers never detach, so the shared flag is not queried again
+            self.attached = None
+            return True
+        return False
+
+    def publish(self, event):
+        try:
+            self.events.put(event, block=not self.stalled and self._reader_attached(), timeout=self.put_timeout)
+            self.stalled = False
+        except queue.Full:
+            self.stalled = True
+            self.dropped += 1
+
+
+class EventLog:
+    """
+    Keeps the latest events read from a job's queue, so that more than one stream can follow the job.
+
+    The queue has a single consumer, so one reader at a time moves events from it into `history` while the
+    others wait on `condition`. Events are numbered from the start of the job; `history` holds the last
+    `max_events` of them, starting at `start`. Each reader follows the log from its own position, which
+    lets a second stream read the same job and a reconnecting EventSource resume after its Last-Event-ID.
+    A reader that has fallen behind the buffer continues from the oldest event still kept. Events dropped
+    by the `EventPublisher` never reach the log.
+    """
+
+    def __init__(self, events, attached, max_events=256):
+        self.events = events
+        self.attached = attached
+        self.history = deque(maxlen=max_events)
+        self.start = 0
+        self.pulling = False
+        self.condition = threading.Condition()
+
+    def read(self, position, timeout):
+        """
+        Returns the number of the first event returned and the events from `position` on, waiting up to
+        `timeout` seconds for one when there are none.
+        """
+        self.attached.set()
+        with self.condition:
+            if position < self.start + len(self.history):
+                return self._since(position)
+            if self.pulling:
+                self.condition.wait(timeout)
+                return self._since(position)
+            self.pulling = True
+
+        pulled = []
+        try:
+            pulled.append(self.events.get(timeout=timeout))
+            while True:
+                pulled.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        finally:
+            with self.condition:
+                for event in pulled:
+                    if len(self.history) == self.history.maxlen:
+                        self.start += 1
+                    self.history.append(event)
+                self.pulling = False
+                self.condition.notify_all()
+        with self.condition:
+            return self._since(position)
+
+    def drained(self, position):
+        with self.condition:
+            return position >= self.start + len(self.history) and not self.pulling and self.events.empty()
+
+    def clear(self):
+        """
+        Drops the kept events; later ones are still numbered after them.
+        """
+        with self.condition:
+            self.start += len(self.history)
+            self.history.clear()
+
+    def _since(self, position):
+        position = max(position, self.start)
+        return position, list(islice(self.history, position - self.start, None))
+
+
+def run_job(config, events=None, put_timeout=5.0, attached=None):
+    """
+    Runs one BFS-AMCC job inside a service worker, reusing the worker's warm dataset, model and explainer.
+    Per-instance results are published on `events` as they are produced (see `EventPublisher`).
+    """
+    on_result = EventPublisher(events, put_timeout, attached).publish if events is not None else None
+    return run_bfs_amcc(config, reuse_context=True, on_result=on_result)
+
+
+class JobService:
+    """
+    A pool of long-lived worker processes that run BFS-AMCC jobs in the background.
+
+    Each worker keeps the datasets, models and explainers it has built, keyed by config (see
+    `bfs_amcc_runner.build_context`), so repeated jobs skip the setup work. Every job gets a bounded event
+    queue that its worker fills with per-instance results, read through `events`. Events are only buffered
+    without loss once a reader has attached; earlier ones beyond `event_buffer_size` are dropped.
+
+    Attributes:
+    ----------
+    max_workers : int
+        Number of worker processes.
+    max_finished_jobs : int
+        Number of finished jobs whose results are kept; older ones are forgotten first.
+    event_buffer_size : int
+        Maximum number of events per job waiting in its queue, and kept for its streams afterwards.
+    """
+
+    def __init__(self, max_workers=2, max_finished_jobs=100, event_buffer_size=256):
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self.event_buffer_size = event_buffer_size
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.manager = multiprocessing.Manager()
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, config):
+        """
+        Queues a job and returns its id without waiting for it.
+        """
+        job_id = uuid.uuid4().hex
+        events = self.manager.Queue(maxsize=self.event_buffer_size)
+        attached = self.manager.Event()
+        future = self.executor.submit(run_job, config, events, attached=attached)
+        with self.lock:
+            self.jobs[job_id] = (future, EventLog(events, attached, self.event_buffer_size))
+            self._forget_finished_jobs()
+        return job_id
+
+    def status(self, job_id):
+        """
+        Returns 'pending', 'running', 'done', 'failed' or 'cancelled', or None for an unknown job.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        future = job[0]
+        if future.running():
+            return "running"
+        if not future.done():
+            return "pending"
+        if future.cancelled():
+            return "cancelled"
+        return "failed" if future.exception() is not None else "done"
+
+    def result(self, job_id):
+        """
+        Returns the `run_bfs_amcc` result of a finished job. Raises the job's exception if it failed, or
+        `CancelledError` if it was cancelled.
+        """
+        with self.lock:
+            future = self.jobs[job_id][0]
+        return future.result(timeout=0)
+
+    def events(self, job_id, heartbeat=1.0, last_event_id=None):
+        """
+        Yields `(event_id, event)` for the job's per-instance result events as they arrive, starting after
+        `last_event_id` when given, None every `heartbeat` seconds without one, and finally
+        `(None, {"event": "end", "status": ...})` once the job has finished and its queue is drained. The
+        job's kept events are then dropped, so a later stream only gets the end event.
+        """
+        with self.lock:
+            future, log = self.jobs[job_id]
+        position = 0 if last_event_id is None else last_event_id + 1
+        while True:
+            position, events = log.read(position, heartbeat)
+            for event_id, event in enumerate(events, start=position):
+                yield event_id, event
+            position += len(events)
+            if events:
+                continue
+            if future.done() and log.drained(position):
+                log.clear()
+                end = {"event": "end", "status": self.status(job_id)}
+                if end["status"] == "failed":
+                    end["message"] = str(future.exception())
+                yield None, end
+                return
+            yield None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, (future, _) in self.jobs.items() if future.done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
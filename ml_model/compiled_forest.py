@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Inference-only copy of a fitted RandomForestClassifier.
+
+    The nodes of all trees are flattened into contiguous arrays and every (row, tree) pair is walked down
+    at once, one tree level per step. Leaves point to themselves, and pairs that reach one are dropped
+    from the next steps. Inputs are cast to float32 like sklearn does, and the per-tree probabilities are
+    summed in estimator order, so `predict_proba` matches a single-threaded sklearn forest bit for bit.
+
+    Batches of more than `max_vectorised_rows` rows are walked with each tree's own compiled `apply`
+    instead, which is faster once the per-call overhead is amortised.
+    """
+    max_vectorised_rows = 16
+
+    def __init__(self, classifier):
+        if classifier.n_outputs_ != 1:
+            raise ValueError("CompiledForest only supports single-output forests")
+        self.classes_ = classifier.classes_
+        self.n_classes = len(classifier.classes_)
+        self.n_trees = len(classifier.estimators_)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in classifier.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            # the normalisation of DecisionTreeClassifier.predict_proba, done once per node
+            proba = tree.value[:, 0, :self.n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+            roots.append(offset)
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.value = np.concatenate(values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.trees = [estimator.tree_ for estimator in classifier.estimators_]
+
+    def apply(self, X):
+        """Returns the global leaf index reached by every row in every tree, shape (n_rows, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[0] > self.max_vectorised_rows:
+            return np.stack([tree.apply(X) for tree in self.trees], axis=1) + self.roots
+        nodes = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0).ravel()
+        rows = np.repeat(np.arange(X.shape[0]), self.n_trees)
+        # (row, tree) pairs that have not reached a leaf yet
+        active = np.arange(nodes.shape[0])
+        while active.shape[0]:
+            current = nodes[active]
+            go_left = X[rows[active], self.feature[current]] <= self.threshold[current]
+            following = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = following
+            active = active[following != current]
+        return nodes.reshape(X.shape[0], self.n_trees)
+
+    def predict_proba(self, X):
+        leaf_proba = self.value[self.apply(X)]
+        # cumsum adds the trees one after the other, like sklearn's accumulation
+        return np.cumsum(leaf_proba, axis=1)[:, -1] / self.n_trees
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
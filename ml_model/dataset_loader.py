@@ -1,18 +1,25 @@
 from anchor import utils
+from utils.fingerprint import file_digest, fingerprint
 
 
 class DatasetLoader:
-    def __init__(self, data_path, target_idx, delimiter=',', feature_names=None):
+    def __init__(self, data_path, target_idx, delimiter=',', feature_names=None, cache_dir=None):
         self.data_path = data_path
         self.target_idx = target_idx
         self.delimiter = delimiter
         self.feature_names = feature_names
+        self.test_size = .2
+        self.cache_dir = cache_dir
+        self.data_digest = file_digest(data_path)
         self.dataset = self.load_csv_dataset()
+        self.fingerprint = fingerprint(self.data_digest, target_idx, delimiter, feature_names,
+                                       self.test_size)
 
     def load_csv_dataset(self):
         dataset = utils.load_csv_dataset(self.data_path, self.target_idx,
                                          self.delimiter, self.feature_names,
                                          discretize=True,
-                                         test_size=.2)
+                                         test_size=self.test_size,
+                                         cache_dir=self.cache_dir,
+                                         data_digest=self.data_digest)
         return dataset
-
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MemoizedPredictor:
+    """
+    Wraps an `ML_Model` and remembers the class probabilities of the rows it has scored.
+
+    On discretised data every feature holds a small bin index, so the rows seen by BFS-AMCC and the anchor
+    sampler repeat a lot. Rows are keyed by their bin vector packed to one byte per feature (by their
+    float32 bytes when a value is not a bin index in 0..255), and the `max_entries` most recently used
+    rows are kept. Only rows missing from the table, deduplicated, reach the wrapped predictor.
+
+    Attributes:
+    ----------
+    predictor : ML_Model
+        The wrapped model; its `classifier`, `classes`, `fingerprint` and `model_fingerprint` are exposed
+        unchanged.
+    max_entries : int
+        Number of rows remembered.
+    hits, misses : int
+        Rows answered and not answered from the table since the wrapper was created.
+    """
+    def __init__(self, predictor, max_entries=65536):
+        self.predictor = predictor
+        self.classifier = predictor.classifier
+        self.classes = predictor.classes
+        self.fingerprint = predictor.fingerprint
+        self.model_fingerprint = predictor.model_fingerprint
+        self.max_entries = max_entries
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    @staticmethod
+    def _keys(X):
+        packed = X.astype(np.uint8)
+        if not np.array_equal(packed, X):
+            # same precision as the forest input, so equal keys always get equal predictions
+            packed = X.astype(np.float32)
+        return [row.tobytes() for row in packed]
+
+    def predict_proba(self, instance):
+        X = np.asarray(instance)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        keys = self._keys(X)
+        proba = np.empty((X.shape[0], len(self.classes)))
+        missing = OrderedDict()
+        for i, key in enumerate(keys):
+            row = self.table.get(key)
+            if row is None:
+                missing.setdefault(key, []).append(i)
+                continue
+            self.table.move_to_end(key)
+            proba[i] = row
+        n_missing = sum(len(rows) for rows in missing.values())
+        self.hits += X.shape[0] - n_missing
+        self.misses += n_missing
+
+        if missing:
+            computed = self.predictor.predict_proba(X[[rows[0] for rows in missing.values()]])
+            for (key, rows), row in zip(missing.items(), computed):
+                proba[rows] = row
+                self.table[key] = row
+            while len(self.table) > self.max_entries:
+                self.table.popitem(last=False)
+        return proba
+
+    def predict(self, instance):
+        return self.classes.take(np.argmax(self.predict_proba(instance), axis=1), axis=0)
@@ -1,30 +1,111 @@
+import hashlib
+import json
+import os
+import joblib
+import numpy as np
+import sklearn
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
+from ml_model.compiled_forest import CompiledForest
+from utils.fingerprint import fingerprint
+
+ARTIFACT_VERSION = 1
+
 
 class ML_Model:
-    def __init__(self, dataset):
+    """
+    Random forest trained on a dataset's train split.
+
+    When `artifact_dir` is given, the fitted classifier is stored there under a fingerprint of the data,
+    the hyperparameters and the library versions. A later model with the same fingerprint loads it instead
+    of refitting.
+
+    `fingerprint` names the artifact before anything is fitted, so it cannot tell two fits apart; caches of
+    model outputs are keyed by `model_fingerprint`, which also covers the fitted trees.
+
+    With `compiled` (the default), `predict` and `predict_proba` run on a `CompiledForest` copy of the
+    classifier, which returns the same results without sklearn's per-call overhead.
+    """
+    # a fixed random_state makes every fit of the same data produce the same trees
+    hyperparameters = {"n_estimators": 100, "criterion": "log_loss", "max_features": "log2", "random_state": 1}
+
+    def __init__(self, dataset, artifact_dir=None, data_fingerprint=None, compiled=True):
         self.train_data = dataset.train
         self.train_labels = dataset.labels_train
         self.val_data = dataset.validation
         self.val_labels = dataset.labels_validation
         self.test_data = dataset.test
         self.test_labels = dataset.labels_test
-        self.classifier = self.train()
+        self.artifact_dir = artifact_dir
+        self.fingerprint = self.compute_fingerprint(data_fingerprint)
+        self.classifier = self.load()
+        if self.classifier is None:
+            self.classifier = self.train()
+            self.save()
+        self.classes = self.classifier.classes_
+        self.model_fingerprint = self.compute_model_fingerprint()
+        self.compiled_forest = CompiledForest(self.classifier) if compiled else None
+
+    def compute_fingerprint(self, data_fingerprint=None):
+        if data_fingerprint is None:
+            data_fingerprint = fingerprint(*(self._array_digest(array) for array in
+                                             (self.train_data, self.train_labels)))
+        return fingerprint(ARTIFACT_VERSION, data_fingerprint, self.hyperparameters,
+                           sklearn.__version__, np.__version__)
+
+    def compute_model_fingerprint(self):
+        trees = [estimator.tree_ for estimator in self.classifier.estimators_]
+        return fingerprint(self.fingerprint, [[self._array_digest(array) for array in
+                                               (tree.feature, tree.threshold, tree.children_left,
+                                                tree.children_right, tree.value)] for tree in trees])
+
+    @staticmethod
+    def _array_digest(array):
+        digest = hashlib.sha256(array.tobytes()).hexdigest()
+        return fingerprint(str(array.dtype), array.shape, digest)
 
     def train(self):
-        classifier = RandomForestClassifier(n_estimators=100, n_jobs=5,
-                                            criterion="log_loss",
-                                            max_features="log2")
+        classifier = RandomForestClassifier(n_jobs=5, **self.hyperparameters)
         classifier.fit(self.train_data, self.train_labels)
         self.importances = classifier.feature_importances_
         return classifier
 
+    def _artifact_path(self):
+        return os.path.join(self.artifact_dir, f"{self.fingerprint}.joblib")
+
+    def save(self):
+        if self.artifact_dir is None:
+            return
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        path = self._artifact_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({"classifier": self.classifier, "importances": self.importances}, tmp_path)
+        os.replace(tmp_path, path)
+        metadata = {"fingerprint": self.fingerprint, "artifact_version": ARTIFACT_VERSION,
+                    "hyperparameters": self.hyperparameters, "sklearn": sklearn.__version__}
+        with open(os.path.join(self.artifact_dir, f"{self.fingerprint}.json"), "w") as file:
+            json.dump(metadata, file, indent=4)
+
+    def load(self):
+        if self.artifact_dir is None or not os.path.exists(self._artifact_path()):
+            return None
+        artifact = joblib.load(self._artifact_path())
+        self.importances = artifact["importances"]
+        return artifact["classifier"]
+
     def predict(self, instance):
+        if self.compiled_forest is not None:
+            return self.compiled_forest.predict(instance)
         prediction = self.classifier.predict(instance)
         return prediction
 
+    def predict_proba(self, instance):
+        if self.compiled_forest is not None:
+            return self.compiled_forest.predict_proba(instance)
+        return self.classifier.predict_proba(instance)
+
     def test(self):
-        predictions = self.classifier.predict(self.test_data)
+        predictions = self.predict(self.test_data)
         accuracy = accuracy_score(self.test_labels, predictions)
         print("Accuracy:", accuracy)
         print("Classification report:\n", classification_report(self.test_labels, predictions))
@@ -26,16 +26,11 @@ function runBFS(event) {
         dataType: 'json',
         data: formData,
         success: function (data) {
-            $("#spinner").hide();
-            if (data.status === "success") {
-                logMessage("Processing was successful!");
-
-                if (data.messages && data.messages.length > 0) {
-                    data.messages.forEach(function (msg) {
-                        logMessage(msg);
-                    });
-                }
+            if (data.status === "submitted") {
+                logMessage("Job " + data.job_id + " submitted.");
+                waitForResult(data.job_id);
             } else {
+                $("#spinner").hide();
                 logMessage("Error: " + (data.message || "Unknown error occurred during BFS processing!"), true);
             }
         },
@@ -46,18 +41,41 @@ function runBFS(event) {
     });
 }
 
+// Stream per-instance results of a job until it has finished
+function waitForResult(jobId) {
+    var source = new EventSource('/jobs/' + jobId + '/events');
+
+    source.addEventListener('result', function (e) {
+        var result = JSON.parse(e.data);
+        logMessage("Instance " + result.instance_index + " (" + result.status + ", " +
+                   result.time.toFixed(3) + "s, " + result.nodes_expanded + " nodes expanded)");
+        result.messages.forEach(function (msg) {
+            logMessage(msg);
+        });
+    });
+
+    source.addEventListener('end', function (e) {
+        var end = JSON.parse(e.data);
+        source.close();
+        $("#spinner").hide();
+        if (end.status === "done") {
+            logMessage("Processing was successful!");
+        } else {
+            logMessage("Error: " + (end.message || "Unknown error occurred during BFS processing!"), true);
+        }
+    });
+
+    source.onerror = function () {
+        if (source.readyState === EventSource.CLOSED) {
+            $("#spinner").hide();
+            logMessage("Lost connection to the job event stream.", true);
+        }
+    };
+}
+
 $(document).ready(function() {
     // Set up the button event listener
     $("#run").submit(runBFS);
 
-    // Fetch logs every second and display them
-    window.setInterval(function () {
-        $.get("/log", function(logs) {
-            logs.forEach(function(log) {
-                logMessage(log);
-            });
-        });
-    }, 1000);
-
     logMessage("Program loaded and ready!");
 });
\ No newline at end of file
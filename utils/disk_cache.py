@@ -0,0 +1,135 @@
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+class DiskCache:
+    """
+    Key-value cache with an in-memory LRU layer and an optional SQLite store shared between processes.
+
+    Values are pickled. The SQLite store keeps the most recently used entries within `max_bytes` of
+    pickled data and evicts the least recently used ones first. Uses answered from memory are written back
+    to the store's access times in batches of `touch_batch_size`, before any other write, so eviction
+    follows them too. Each process opens its own connection, so a cache handed to pool workers can be used
+    from all of them.
+
+    Attributes:
+    ----------
+    path : str or None
+        SQLite file backing the cache, or None for a purely in-memory cache.
+    max_entries : int
+        Number of entries kept in memory.
+    max_bytes : int or None
+        Maximum total size of the pickled values in the SQLite store; None for no limit.
+    touch_batch_size : int
+        Number of memory hits whose access times are written to the store at once.
+    hits, misses : int
+        Lookups answered and not answered by this process since the cache was created.
+    """
+    def __init__(self, path=None, max_entries=1024, max_bytes=None, touch_batch_size=64):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_batch_size = touch_batch_size
+        self.memory = OrderedDict()
+        self.touched = {}
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["touched"] = {}
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def get(self, key, default=None):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            if self.path is not None:
+                self.touched[key] = time.time()
+                if len(self.touched) >= self.touch_batch_size:
+                    with self._connect() as connection:
+                        self._write_touched(connection)
+            return self.memory[key]
+        if self.path is not None:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.touched[key] = time.time()
+                with connection:
+                    self._write_touched(connection)
+                value = pickle.loads(row[0])
+                self._remember(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.path is None:
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        connection = self._connect()
+        with connection:
+            self._write_touched(connection)
+            connection.execute("INSERT OR REPLACE INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                               (key, blob, len(blob), time.time()))
+            if self.max_bytes is not None:
+                self._evict(connection)
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def flush(self):
+        """
+        Writes the pending access times of memory hits to the store.
+        """
+        if self.path is not None and self.touched:
+            with self._connect() as connection:
+                self._write_touched(connection)
+
+    def _write_touched(self, connection):
+        connection.executemany("UPDATE cache SET accessed = ? WHERE key = ?",
+                               [(accessed, key) for key, accessed in self.touched.items()])
+        self.touched = {}
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = connection.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM cache WHERE key = ?", stale)
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                self._connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, "
+                                         "size INTEGER, accessed REAL)")
+            self._pid = os.getpid()
+        return self._connection
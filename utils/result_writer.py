@@ -0,0 +1,229 @@
+import csv
+import json
+import os
+
+RESULT_COLUMNS = ["instance_index", "success", "failure", "time", "status", "modified_instances", "changes",
+                  "visited_hits", "visited_misses", "nodes_scored", "nodes_expanded"]
+
+
+class ResultWriter:
+    """
+    Appends one row per processed instance to an output file, flushing every `flush_every` rows, so a
+    run that stops early keeps everything written so far.
+
+    With `resume`, the file is first cut back to its last complete record, dropping a row that was only
+    partly written when the previous run stopped, and new rows are appended after it.
+
+    Subclasses implement `_open`, `_write_rows` and `_read_records` for one file format.
+    """
+    def __init__(self, path, resume=False, flush_every=10):
+        self.path = path
+        self.resume = resume
+        self.flush_every = flush_every
+        self.pending = []
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self._write_rows(self.pending)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+
+    @classmethod
+    def completed_indices(cls, path):
+        """
+        Returns the instance indices of the complete records already present in the output at `path`.
+        """
+        records, _ = cls._read_records(path)
+        return {int(record["instance_index"]) for record in records
+                if record.get("instance_index") not in (None, "")}
+
+    @classmethod
+    def _read_records(cls, path):
+        """
+        Returns the complete records at the start of the output at `path`, as dicts, and the byte offset at
+        which they end.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _complete_lines(path):
+        """
+        Yields every newline-terminated line of the file at `path` with the byte offset at which it ends.
+        """
+        end = 0
+        with open(path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    return
+                end += len(line)
+                yield line.decode("utf-8"), end
+
+    def _recover(self):
+        """
+        When resuming into an existing file, cuts it back to its last complete record. Returns whether any
+        content is left to append to.
+        """
+        if not (self.resume and os.path.exists(self.path)):
+            return False
+        _, end = self._read_records(self.path)
+        with open(self.path, "r+b") as file:
+            file.truncate(end)
+        return end > 0
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+
+class CSVResultWriter(ResultWriter):
+    """
+    Writes rows as CSV. Lists and dicts are written as their Python literals, None as an empty field.
+    """
+    def _open(self):
+        append = self._recover()
+        self.file = open(self.path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=RESULT_COLUMNS)
+        if not append:
+            self.writer.writeheader()
+
+    def _write_rows(self, rows):
+        self.writer.writerows({key: "" if row[key] is None else row[key] for key in RESULT_COLUMNS}
+                              for row in rows)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+    @classmethod
+    def _read_records(cls, path):
+        """
+        Reads the rows after the header up to the first one that is cut off or has the wrong number of
+        fields. Raises ValueError if the header is not `RESULT_COLUMNS`, rather than appending rows that
+        do not match it.
+        """
+        if not os.path.exists(path):
+            return [], 0
+        ends = []
+
+        def lines():
+            for line, end in cls._complete_lines(path):
+                ends.append(end)
+                yield line
+
+        reader = csv.reader(lines(), strict=True)
+        try:
+            header = next(reader, None)
+        except csv.Error:
+            header = None
+        if header is None:
+            return [], 0
+        if header != RESULT_COLUMNS:
+            raise ValueError(f"Cannot resume {path}: its columns {header} are not {RESULT_COLUMNS}.")
+        records, end = [], ends[-1]
+        try:
+            for row in reader:
+                if len(row) != len(RESULT_COLUMNS):
+                    break
+                records.append(dict(zip(RESULT_COLUMNS, row)))
+                end = ends[-1]
+        except csv.Error:
+            pass
+        return records, end
+
+
+class JSONLResultWriter(ResultWriter):
+    """
+    Writes one JSON object per line.
+    """
+    def _open(self):
+        append = self._recover()
+        self.file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    def _write_rows(self, rows):
+        self.file.writelines(json.dumps({key: row[key] for key in RESULT_COLUMNS}) + "\n" for row in rows)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+    @classmethod
+    def _read_records(cls, path):
+        """
+        Reads the lines up to the first one that is cut off or is not a JSON object.
+        """
+        if not os.path.exists(path):
+            return [], 0
+        records, end = [], 0
+        for line, line_end in cls._complete_lines(path):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not isinstance(record, dict):
+                    break
+                records.append(record)
+            end = line_end
+        return records, end
+
+
+class ParquetResultWriter(ResultWriter):
+    """
+    Writes one Parquet row group per flush. `modified_instances` and `changes` are stored as JSON strings.
+    Requires pyarrow. Resuming is not supported, since a Parquet file cannot be appended to once closed.
+    """
+    def _open(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing Parquet output requires pyarrow: pip install pyarrow")
+        if self.resume:
+            raise ValueError("Resuming is not supported for Parquet output.")
+        self.pyarrow = pyarrow
+        self.writer = None
+
+    def _write_rows(self, rows):
+        columns = {key: [json.dumps(row[key]) if key in ("modified_instances", "changes") else row[key]
+                         for row in rows] for key in RESULT_COLUMNS}
+        table = self.pyarrow.table(columns)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.writer.close()
+
+    @classmethod
+    def completed_indices(cls, path):
+        return set()
+
+
+RESULT_WRITERS = {".csv": CSVResultWriter, ".jsonl": JSONLResultWriter, ".parquet": ParquetResultWriter}
+
+
+def result_writer_class(path):
+    """
+    Returns the `ResultWriter` subclass for the extension of `path`; unknown extensions default to CSV.
+    """
+    return RESULT_WRITERS.get(os.path.splitext(path)[1].lower(), CSVResultWriter)
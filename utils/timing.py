@@ -1,31 +1,35 @@
 import time
-import signal
 
 
-class Timeout:
+class Deadline:
     """
-    Context manager to set a timeout for a block of code.
+    Cooperative time budget for a block of code.
+
+    Unlike a signal-based alarm it works in any thread and supports sub-second budgets: long-running
+    searches poll `expired()` at safe points and stop with their best partial result.
     """
     def __init__(self, seconds):
         self.seconds = seconds
-        self.start_time = None
+        self.start_time = time.perf_counter()
         self.end_time = None
 
     def __enter__(self):
-        self.start_time = time.time()
-        signal.signal(signal.SIGALRM, self.timeout_handler)
-        signal.alarm(self.seconds)
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        return self
 
     def __exit__(self, type, value, traceback):
-        self.end_time = time.time()
-        signal.alarm(0)  # Disable the alarm
+        self.end_time = time.perf_counter()
+
+    def remaining(self):
+        if self.seconds is None:
+            return float("inf")
+        return self.seconds - (time.perf_counter() - self.start_time)
+
+    def expired(self):
+        return self.remaining() <= 0
 
     @property
     def elapsed_time(self):
-        if self.start_time is not None and self.end_time is not None:
-            return self.end_time - self.start_time
-        return None
-
-    @staticmethod
-    def timeout_handler(signum, frame):
-        raise TimeoutError("Code block timed out!")
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time